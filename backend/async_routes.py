@@ -0,0 +1,73 @@
+import functools
+import inspect
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_read_session, get_async_session, get_read_session, get_session
+
+# Sync session dependency -> async replacement
+ASYNC_DEPENDENCIES = {
+    get_session: get_async_session,
+    get_read_session: get_async_read_session,
+}
+
+def _session_parameter(signature: inspect.Signature):
+    for parameter in signature.parameters.values():
+        if getattr(parameter.default, "dependency", None) in ASYNC_DEPENDENCIES:
+            return parameter
+    return None
+
+def asyncify(endpoint):
+    # Wraps a route written against a sync Session into an async route on an
+    # AsyncSession. Sync handlers run through AsyncSession.run_sync, so the
+    # database I/O is awaited instead of holding a threadpool thread, while
+    # the handler code, validation and response models stay shared. Async
+    # handlers are expected to use database.run_db and get the session as is.
+    signature = inspect.signature(endpoint)
+    session_parameter = _session_parameter(signature)
+    if session_parameter is None:
+        return endpoint
+    name = session_parameter.name
+
+    if inspect.iscoroutinefunction(endpoint):
+        async def wrapper(**kwargs):
+            return await endpoint(**kwargs)
+    else:
+        async def wrapper(**kwargs):
+            session = kwargs.pop(name)
+            return await session.run_sync(lambda sync_session: endpoint(**{name: sync_session}, **kwargs))
+
+    functools.update_wrapper(wrapper, endpoint)
+    del wrapper.__wrapped__  # FastAPI must read the replaced signature, not the original
+    wrapper.__signature__ = signature.replace(parameters=[
+        parameter.replace(
+            default=Depends(ASYNC_DEPENDENCIES[parameter.default.dependency]),
+            annotation=AsyncSession,
+        ) if parameter is session_parameter else parameter
+        for parameter in signature.parameters.values()
+    ])
+    return wrapper
+
+def async_router(router: APIRouter) -> APIRouter:
+    result = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            result.routes.append(route)
+            continue
+        result.add_api_route(
+            route.path,
+            asyncify(route.endpoint),
+            methods=list(route.methods),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            name=route.name,
+            summary=route.summary,
+            description=route.description,
+            response_class=route.response_class,
+            responses=route.responses,
+            tags=route.tags,
+            dependencies=route.dependencies,
+            deprecated=route.deprecated,
+            include_in_schema=route.include_in_schema,
+        )
+    return result
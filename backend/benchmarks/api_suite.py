@@ -0,0 +1,410 @@
+"""Benchmark suite for the services API.
+
+Seeds synthetic services (Hebrew text, typed dates and flags) at each size,
+starts uvicorn on the seeded database and measures create, bulk import, list
+(plain, filtered, search, cursor paging), detail and patch: requests/s and
+latency percentiles, written as JSON so runs can be compared between commits.
+
+    python benchmarks/api_suite.py run --sizes 1k,100k,1m --output results.json
+    python benchmarks/api_suite.py compare baseline.json results.json --threshold 10
+
+Seeding goes through bulk.ingest_batch (the code behind POST /services/bulk)
+and is deterministic for a given --seed; --seed-cache DIR keeps the seeded
+databases so later runs, e.g. on another commit, start from the same data.
+compare exits with status 1 if any scenario got slower than the threshold.
+The response cache is off unless --cache is given, so reads hit the database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+
+from async_vs_sync import BACKEND_DIR, start_server
+
+ORGANIZATIONS = ["בנק", "ביטוח", "אשראי", "כרטיסי אשראי", "בית השקעות", "פנסיה"]
+REQUESTING_UNITS = ["חטיבת טכנולוגיות", "חטיבה עסקית", "חטיבת סיכונים", "חטיבת כספים", "משאבי אנוש", "שירות לקוחות"]
+STATUSES = ["אושר", "בבדיקה", "נדחה", "ממתין לועדה", "אושר בתנאים"]
+APPROVAL_PATHS = ["מסלול מקוצר", "מסלול מלא", "ועדת היגוי"]
+PEOPLE = ["ישראל ישראלי", "דנה כהן", "יוסי לוי", "מיכל אברהם", "אבי מזרחי", "נועה פרץ", "רון ביטון", "שירה דהן"]
+PRODUCTS = ["פורטל", "מערכת", "שירות", "פלטפורמת", "ממשק", "אפליקציית", "מנוע", "מאגר"]
+TOPICS = [
+    "מסמכים", "תשלומים", "לקוחות", "הלוואות", "גיבוי", "ניטור", "הרשאות", "דיוור", "חתימה דיגיטלית",
+    "ניהול סיכונים", "אנליטיקה", "שיחות", "תביעות", "פיקדונות", "רגולציה", "גיוס עובדים",
+]
+DESCRIPTION_WORDS = [
+    "פתרון", "ענן", "לניהול", "תהליכים", "נתונים", "אחסון", "מוצפן", "בזמן", "אמת", "עבור", "הלקוחות",
+    "הארגון", "כולל", "ממשק", "משתמש", "דוחות", "אינטגרציה", "עם", "מערכות", "הליבה", "ספק", "חיצוני",
+    "מבוסס", "שירות", "מנוהל", "גישה", "מרחוק", "אבטחת", "מידע", "זמינות", "גבוהה",
+]
+SEARCH_TERMS = ["מסמכים", "תשלומים", "ניטור", "אחסון", "הלקוחות", "רגולציה", "אנליטיקה", "הרשאות"]
+FLAG_FIELDS = ["is_significant_cyber", "is_significant_outsourcing", "is_bia_relevant"]
+# Part of --seed-cache file names; bump when the seeded data changes
+SEED_FORMAT = 2
+FIRST_COMMITTEE = date(2019, 1, 1)
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SEED_BATCH_SIZE = 5000
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    return SIZES[text] if text in SIZES else int(text)
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(DESCRIPTION_WORDS) for _ in range(words))
+
+def _date(rng: random.Random, after: date = FIRST_COMMITTEE, days: int = 2500) -> str:
+    return (after + timedelta(days=rng.randrange(days))).isoformat()
+
+def make_service(rng: random.Random, number: int) -> dict:
+    topic = rng.choice(TOPICS)
+    committee_date = _date(rng)
+    status = rng.choice(STATUSES)
+    service = {
+        "system_name": f"{rng.choice(PRODUCTS)} {topic} {number}",
+        "organization": rng.choice(ORGANIZATIONS),
+        "committee_date": committee_date,
+        "requesting_unit": rng.choice(REQUESTING_UNITS),
+        "requesting_product_manager": rng.choice(PEOPLE),
+        "applicant": rng.choice(PEOPLE),
+        "cmdb_id": rng.randrange(100_000, 999_999),
+        "solution_description": f"{_sentence(rng, rng.randint(8, 30))} {topic}",
+        "approval_path": rng.choice(APPROVAL_PATHS),
+        "status": status,
+        "committee_summary": _sentence(rng, rng.randint(5, 15)),
+        "committee_notes": _sentence(rng, rng.randint(0, 10)) or None,
+        "explanation_data_leakage": _sentence(rng, 6),
+        "score_data_leakage": rng.randint(0, 30),
+        "explanation_provider_fit": _sentence(rng, 6),
+        "score_provider_fit": rng.randint(0, 15),
+        "explanation_service_failure": _sentence(rng, 6),
+        "score_service_failure": rng.randint(0, 30),
+        "explanation_compliance": _sentence(rng, 6),
+        "score_compliance": rng.randint(0, 15),
+        "explanation_exit_strategy": _sentence(rng, 6),
+        "score_exit_strategy": rng.randint(0, 10),
+    }
+    if status.startswith("אושר"):
+        service["approver"] = rng.choice(PEOPLE)
+        service["approval_date"] = _date(rng, date.fromisoformat(committee_date), 90)
+    for flag in FLAG_FIELDS:
+        service[flag] = rng.choice([True, False, None])
+    return service
+
+def seed_database(path: str, rows: int, seed: int) -> float:
+    # In-process, through the same ingest code as POST /services/bulk, so
+    # rollups, the search index and history are filled as in production.
+    sys.path.insert(0, BACKEND_DIR)
+    from bulk import ingest_batch
+    from database import create_engines
+    from migrations import migrate
+    from models import BulkResult
+    from sqlmodel import Session
+
+    writer, reader = create_engines(path)
+    started = time.perf_counter()
+    with writer.begin() as connection:
+        migrate(connection)
+    rng = random.Random(seed)
+    result = BulkResult()
+    with Session(writer) as session:
+        for start in range(0, rows, SEED_BATCH_SIZE):
+            batch = [(i, make_service(rng, i + 1)) for i in range(start, min(start + SEED_BATCH_SIZE, rows))]
+            ingest_batch(session, batch, result, changed_by="benchmark seed")
+    writer.dispose()
+    reader.dispose()
+    if result.errors:
+        raise RuntimeError(f"Seeding failed: {result.errors[0]}")
+    return time.perf_counter() - started
+
+def prepare_database(workdir: str, rows: int, seed: int, seed_cache: str = None) -> dict:
+    # A fresh copy per size: the write scenarios change the data
+    path = os.path.join(workdir, f"services-{rows}.db")
+    cached = os.path.join(seed_cache, f"services-{rows}-seed{seed}-v{SEED_FORMAT}.db") if seed_cache else None
+    if cached and os.path.exists(cached):
+        shutil.copyfile(cached, path)
+        return {"path": path, "seed_seconds": None}
+    seconds = seed_database(path, rows, seed)
+    if cached:
+        os.makedirs(seed_cache, exist_ok=True)
+        # Checkpointed into the main file by the engine dispose above
+        shutil.copyfile(path, cached)
+    return {"path": path, "seed_seconds": round(seconds, 3)}
+
+def percentile(values: list, fraction: float) -> float:
+    # Nearest rank on sorted values
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies: list, errors: int, units: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p90_ms": ms(percentile(latencies, 0.90)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]),
+    }
+    if units != len(latencies):
+        summary["rows_per_s"] = round(units / elapsed, 2)
+    return summary
+
+class Workload:
+    # Request builders for one seeded database. Each returns the response and
+    # the number of rows it handled (more than one only for bulk import).
+    def __init__(self, rows: int, seed: int, bulk_rows: int):
+        self.rows = rows
+        self.bulk_rows = bulk_rows
+        self.rng = random.Random(seed + 1)
+        self.next_number = rows + 1
+
+    def _new_service(self) -> dict:
+        service = make_service(self.rng, self.next_number)
+        self.next_number += 1
+        return service
+
+    def _service_id(self) -> int:
+        return self.rng.randint(1, self.rows)
+
+    async def detail(self, client, state):
+        return await client.get(f"/services/{self._service_id()}"), 1
+
+    async def list(self, client, state):
+        return await client.get("/services/", params={"limit": 50, "fields": "summary"}), 1
+
+    async def list_filtered(self, client, state):
+        params = {
+            "status": self.rng.choice(STATUSES),
+            "organization": self.rng.choice(ORGANIZATIONS),
+            "min_score": self.rng.choice([0, 30, 50, 70]),
+            self.rng.choice(FLAG_FIELDS): self.rng.choice(["true", "false"]),
+            "sort": "-committee_date",
+            "limit": 50,
+            "fields": "summary",
+        }
+        return await client.get("/services/", params=params), 1
+
+    async def list_search(self, client, state):
+        params = {"search": self.rng.choice(SEARCH_TERMS), "limit": 20, "fields": "summary"}
+        return await client.get("/services/", params=params), 1
+
+    async def list_paginate(self, client, state):
+        # Each client walks the whole listing page by page, then starts over
+        params = {"limit": 100, "fields": "summary", "sort": "system_name"}
+        if state.get("cursor"):
+            params["cursor"] = state["cursor"]
+        response = await client.get("/services/", params=params)
+        state["cursor"] = response.headers.get("X-Next-Cursor")
+        return response, 1
+
+    async def similar(self, client, state):
+        return await client.get(f"/services/{self._service_id()}/similar"), 1
+
+    async def patch(self, client, state):
+        body = {"status": self.rng.choice(STATUSES), "committee_notes": _sentence(self.rng, 8)}
+        return await client.patch(f"/services/{self._service_id()}", json=body, headers={"X-User": "benchmark"}), 1
+
+    async def create(self, client, state):
+        return await client.post("/services/", json=self._new_service(), headers={"X-User": "benchmark"}), 1
+
+    async def bulk_import(self, client, state):
+        body = "\n".join(json.dumps(self._new_service(), ensure_ascii=False) for _ in range(self.bulk_rows))
+        response = await client.post(
+            "/services/bulk",
+            content=body.encode("utf-8"),
+            params={"batch_size": min(self.bulk_rows, 5000)},
+            headers={"Content-Type": "application/x-ndjson", "X-User": "benchmark"},
+        )
+        if response.status_code == 200 and response.json()["errors"]:
+            response.status_code = 422
+        return response, self.bulk_rows
+
+# Reads run first, on the data as seeded; writes follow. Bulk import is one
+# client, like import_excel.py; the writer is serialized anyway.
+SCENARIOS = [
+    "detail", "list", "list_filtered", "list_search", "list_paginate", "similar", "patch", "create", "bulk_import",
+]
+SINGLE_CLIENT = {"bulk_import"}
+
+async def run_scenario(url: str, request, concurrency: int, duration: float, warmup: float) -> dict:
+    latencies = []
+    counters = {"errors": 0, "units": 0}
+    recording = False
+    deadline = time.perf_counter() + warmup
+
+    async def worker(client: httpx.AsyncClient):
+        state = {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response, units = await request(client, state)
+            elapsed = time.perf_counter() - start
+            if not recording:
+                continue
+            latencies.append(elapsed)
+            counters["units"] += units
+            if response.status_code >= 400:
+                counters["errors"] += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        if warmup > 0:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        recording = True
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, **summarize(latencies, counters["errors"], counters["units"], elapsed)}
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def environment() -> dict:
+    return {
+        "commit": _git("rev-parse", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--", ".")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def run(args) -> dict:
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    scenarios = args.scenarios.split(",") if args.scenarios else SCENARIOS
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    settings = {
+        "sizes": sizes, "scenarios": scenarios, "seed": args.seed, "duration": args.duration,
+        "warmup": args.warmup, "concurrency": args.concurrency, "bulk_rows": args.bulk_rows,
+        "async": args.async_mode, "cache": args.cache,
+    }
+    report = {"environment": environment(), "settings": settings, "results": []}
+    url = f"http://127.0.0.1:{args.port}"
+    workdir = tempfile.mkdtemp()
+    try:
+        for rows in sizes:
+            print(f"Preparing {rows} services...", flush=True)
+            database = prepare_database(workdir, rows, args.seed, args.seed_cache)
+            launched = time.perf_counter()
+            server = start_server(
+                database["path"], args.port, args.async_mode, wait=args.startup_timeout,
+                CACHE_ENABLED="1" if args.cache else "0",
+            )
+            # Until uvicorn answers: imports, migrations and pre-warming
+            startup_seconds = round(time.perf_counter() - launched, 3)
+            print(f"  {'startup':<14} {startup_seconds * 1000:>7.0f} ms", flush=True)
+            try:
+                workload = Workload(rows, args.seed, args.bulk_rows)
+                results = {}
+                for name in scenarios:
+                    concurrency = 1 if name in SINGLE_CLIENT else args.concurrency
+                    request = getattr(workload, name)
+                    results[name] = asyncio.run(run_scenario(url, request, concurrency, args.duration, args.warmup))
+                    print(f"  {format_result(name, results[name])}", flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+            report["results"].append({
+                "rows": rows, "seed_seconds": database["seed_seconds"], "startup_seconds": startup_seconds,
+                "scenarios": results,
+            })
+            os.remove(database["path"])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def format_result(name: str, r: dict) -> str:
+    if not r.get("requests"):
+        return f"{name:<14} no requests completed"
+    return (
+        f"{name:<14} {r['requests']:>7} req {r['errors']:>4} err {r['rps']:>9.1f} req/s "
+        f"p50 {r['p50_ms']:>8.1f} p95 {r['p95_ms']:>8.1f} p99 {r['p99_ms']:>8.1f} ms"
+    )
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    # Throughput drops and p95 rises beyond threshold percent are regressions
+    regressions = []
+    before = {(r["rows"], name): s for r in baseline["results"] for name, s in r["scenarios"].items()}
+    print(f"{'rows':>8} {'scenario':<14} {'req/s':>10} {'change':>8} {'p95 ms':>10} {'change':>8}")
+    for result in current["results"]:
+        for name, now in result["scenarios"].items():
+            old = before.get((result["rows"], name))
+            if not old or not old.get("requests") or not now.get("requests"):
+                continue
+            rps_change = (now["rps"] - old["rps"]) / old["rps"] * 100
+            p95_change = (now["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+            regressed = rps_change < -threshold or p95_change > threshold
+            marker = "  REGRESSION" if regressed else ""
+            print(
+                f"{result['rows']:>8} {name:<14} {now['rps']:>10.1f} {rps_change:>+7.1f}% "
+                f"{now['p95_ms']:>10.1f} {p95_change:>+7.1f}%{marker}"
+            )
+            if regressed:
+                regressions.append((result["rows"], name))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, run the scenarios and write JSON results")
+    run_parser.add_argument("--sizes", default="1k,100k,1m", help="comma-separated row counts (1k, 100k, 1m or numbers)")
+    run_parser.add_argument("--scenarios", default="", help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    run_parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per scenario")
+    run_parser.add_argument("--warmup", type=float, default=2.0, help="seconds run before measuring")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--bulk-rows", type=int, default=1000, help="rows per bulk import request")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--seed-cache", default=None, help="directory to keep and reuse seeded databases")
+    run_parser.add_argument("--async", dest="async_mode", action="store_true", help="serve with DB_ASYNC=1")
+    run_parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    run_parser.add_argument("--port", type=int, default=8766)
+    run_parser.add_argument("--startup-timeout", type=float, default=120.0)
+    run_parser.add_argument("--output", default="benchmark-results.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed by more than {args.threshold:g}%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Load benchmark: sync handlers vs. async handlers (DB_ASYNC=1).
+
+Starts uvicorn once per mode on the same seeded SQLite file, drives it with
+concurrent clients and prints requests/s and latency percentiles:
+
+    python benchmarks/async_vs_sync.py --rows 5000 --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_server(db_path: str, port: int, async_mode: bool, wait: float = 10.0, **settings: str) -> subprocess.Popen:
+    # Without the response cache unless asked for, so requests reach the handlers
+    env = {**os.environ, "DB_PATH": db_path, "DB_ASYNC": "1" if async_mode else "0", "CACHE_ENABLED": "0", **settings}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.perf_counter() + wait
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(url + "/")
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("uvicorn did not start")
+
+def seed(url: str, rows: int) -> None:
+    services = [
+        {
+            "system_name": f"שירות {i}",
+            "organization": random.choice(["בנק", "ביטוח", "אשראי"]),
+            "status": random.choice(["אושר", "בבדיקה", "נדחה"]),
+            "solution_description": "פתרון ענן לניהול מסמכים ותהליכים " * 3,
+            "score_data_leakage": random.randint(0, 30),
+        }
+        for i in range(rows)
+    ]
+    httpx.post(url + "/services/bulk", json=services, timeout=300).raise_for_status()
+
+async def run_load(url: str, rows: int, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            choice = random.random()
+            if choice < 0.5:
+                path = f"/services/{random.randint(1, rows)}"
+            elif choice < 0.8:
+                path = "/services/?limit=50&fields=summary&status=אושר"
+            elif choice < 0.95:
+                path = "/services/?search=מסמכים&limit=20"
+            else:
+                path = "/stats"
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    try:
+        results = {}
+        for mode in ("sync", "async"):
+            server = start_server(db_path, args.port, async_mode=mode == "async")
+            try:
+                url = f"http://127.0.0.1:{args.port}"
+                if mode == "sync":
+                    seed(url, args.rows)
+                results[mode] = asyncio.run(run_load(url, args.rows, args.concurrency, args.duration))
+            finally:
+                server.terminate()
+                server.wait()
+        print(f"{'mode':<6} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode, r in results.items():
+            print(f"{mode:<6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+from database import dialect_insert
+from models import BulkResult, BulkRowError, CloudService, CloudServiceCreate
+from scoring import compute_scores
+from history import TRACKED_FIELDS, ChangeLog
+from similarity import index_missing_signatures, remove_signatures, text_changed
+from stats import RollupDeltas
+from sync import LIVE, stamp_rows
+
+BULK_BATCH_SIZE = 500
+
+# Plain pydantic validation; SQLModel.model_validate goes through the ORM
+# attribute machinery for every field and dominates bulk ingest time.
+_row_adapter = TypeAdapter(CloudServiceCreate)
+
+def validate_rows(rows: Iterable[Tuple[int, object]], result: BulkResult) -> List[Tuple[int, dict]]:
+    valid = []
+    for index, row in rows:
+        try:
+            service = _row_adapter.validate_python(row)
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()
+            )
+            result.errors.append(BulkRowError(index=index, id=_row_id(row), error=errors))
+            continue
+        values = service.model_dump()
+        values.update(compute_scores(values))
+        valid.append((index, values))
+    return valid
+
+def _row_id(row) -> object:
+    return row.get("id") if isinstance(row, dict) else None
+
+def _upsert_statement(session: Session):
+    stmt = dialect_insert(session)(CloudService)
+    columns = [c.name for c in CloudService.__table__.columns if c.name != "id"]
+    return stmt.on_conflict_do_update(
+        index_elements=[CloudService.id],
+        set_={name: stmt.excluded[name] for name in columns},
+    ).returning(CloudService.id, sort_by_parameter_order=True)
+
+def _upsert(session: Session, values: List[dict]) -> List[int]:
+    # Rows without an id must omit the column so the database assigns one;
+    # executemany needs the same keys in every row, hence two statements.
+    stmt = _upsert_statement(session)
+    keyed = [v for v in values if v["id"] is not None]
+    unkeyed = [{k: x for k, x in v.items() if k != "id"} for v in values if v["id"] is None]
+    keyed_ids = iter(session.execute(stmt, keyed).scalars().all() if keyed else [])
+    new_ids = iter(session.execute(stmt, unkeyed).scalars().all() if unkeyed else [])
+    return [next(keyed_ids) if v["id"] is not None else next(new_ids) for v in values]
+
+def _existing_rows(session: Session, values: List[dict]) -> Dict[int, dict]:
+    # Current state of the rows about to be replaced, for rollups and history
+    ids = [v["id"] for v in values if v["id"] is not None]
+    if not ids:
+        return {}
+    columns = [getattr(CloudService, name) for name in TRACKED_FIELDS]
+    rows = session.exec(select(CloudService.id, *columns).where(CloudService.id.in_(ids), LIVE)).all()
+    return {row.id: dict(zip(TRACKED_FIELDS, row[1:])) for row in rows}
+
+def _write(session: Session, values: List[dict], changed_by: Optional[str]) -> Tuple[List[int], int]:
+    existing = _existing_rows(session, values)
+    updated = 0
+    stamp_rows(session, values)
+    ids = _upsert(session, values)
+    deltas = RollupDeltas()
+    log = ChangeLog(changed_by)
+    reindex = []
+    for row_id, value in zip(ids, values):
+        old = existing.get(row_id)
+        # Counted per row: a repeated id updates the row its first occurrence wrote
+        updated += old is not None
+        deltas.change(old, value)
+        log.add(row_id, old, value)
+        if text_changed(old, value):
+            reindex.append(row_id)
+        existing[row_id] = value  # a later row with the same id replaces this one
+    deltas.apply(session)
+    log.write(session)
+    # Signatures are computed once the import is done (index_imported); until
+    # then a changed row has none rather than one of its old text
+    remove_signatures(session, reindex)
+    return ids, updated
+
+def ingest_batch(
+    session: Session, rows: List[Tuple[int, object]], result: BulkResult, changed_by: Optional[str] = None
+) -> None:
+    # One transaction per batch. Rows with an existing id replace that record
+    # (upsert on id), rows without an id are inserted. If the batch fails as a
+    # whole it is retried row by row so only the offending rows are reported.
+    valid = validate_rows(rows, result)
+    if not valid:
+        return
+    values = [v for _, v in valid]
+    try:
+        ids, updated = _write(session, values, changed_by)
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        for index, value in valid:
+            _ingest_one(session, index, value, result, changed_by)
+        return
+    result.created += len(ids) - updated
+    result.updated += updated
+    result.ids.extend(ids)
+
+def _ingest_one(session: Session, index: int, value: dict, result: BulkResult, changed_by: Optional[str]) -> None:
+    try:
+        [row_id], updated = _write(session, [value], changed_by)
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        result.errors.append(BulkRowError(index=index, id=value["id"], error=str(getattr(e, "orig", None) or e)))
+        return
+    result.created += 1 - updated
+    result.updated += updated
+    result.ids.append(row_id)
+
+def index_imported(session: Session, service_ids: List[int]) -> None:
+    # Similarity signatures of the rows an import wrote, after the response:
+    # hashing them inside the batches made imports about half again as slow
+    index_missing_signatures(session, service_ids)
+    session.commit()
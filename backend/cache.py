@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Response cache for GET requests, invalidated by a version that changes with
+# every write. Entries are only served while their version is current, so a
+# write makes every cached response stale at once. The version combines a
+# counter the write handlers bump after every commit with SQLite's
+# data_version of the database file, which changes when any other connection
+# commits, so writes by other worker processes invalidate this one's cache
+# too. Without a SQLite file to watch (e.g. Postgres) only this process's
+# writes are seen, so the cache is opt-in there: for a single worker only.
+# Unset means on with a SQLite file and off otherwise.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BODY_BYTES = int(os.getenv("CACHE_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+CACHEABLE_PREFIXES = ("/services", "/stats")
+
+_lock = threading.Lock()
+_version = 0
+_last_modified = time.time()
+
+def bump_version() -> None:
+    global _version, _last_modified
+    with _lock:
+        _version += 1
+        _last_modified = time.time()
+
+def current_version() -> tuple:
+    with _lock:
+        return _version, _last_modified
+
+class DataVersion:
+    # PRAGMA data_version on a read-only connection of this process's own:
+    # it changes whenever another connection (any process) commits. Opened
+    # on first use, as the database file may not exist yet.
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+        self.value: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def read(self) -> Optional[int]:
+        with self.lock:
+            try:
+                if self.connection is None:
+                    self.connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+                value = self.connection.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                self.connection = None
+                return None
+            if value != self.value:
+                if self.value is not None:
+                    # Written by another process: Last-Modified moves on
+                    bump_version()
+                self.value = value
+            return value
+
+def _etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+def _http_date(timestamp: float) -> bytes:
+    return formatdate(timestamp, usegmt=True).encode()
+
+def _not_modified(request_headers: dict, etag: bytes, last_modified: float) -> bool:
+    if_none_match = request_headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(b",")]
+        return etag in tags or b"W/" + etag in tags or b"*" in tags
+    if_modified_since = request_headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since.decode()).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+class CachedResponse:
+    __slots__ = ("version", "expires", "status", "headers", "body", "etag", "last_modified", "route")
+
+    def __init__(self, version, expires, status, headers, body, etag, last_modified, route):
+        self.version = version
+        self.expires = expires
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.route = route  # matched route, so metrics label cache hits like misses
+
+class ResponseCacheMiddleware:
+    def __init__(
+        self, app, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+        database_path: Optional[str] = None,
+    ):
+        self.app = app
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.data_version = DataVersion(database_path) if database_path else None
+        if CACHE_ENABLED is not None:
+            self.enabled = CACHE_ENABLED == "1"
+        else:
+            # The worker count is not visible from here (uvicorn --workers
+            # and gunicorn -w do not set WEB_CONCURRENCY)
+            self.enabled = self.data_version is not None
+            if not self.enabled:
+                logger.info("Response cache off: no SQLite file to watch; CACHE_ENABLED=1 for a single worker")
+
+    def current_version(self) -> tuple:
+        # Read data_version first: seeing another process's write bumps the counter
+        shared = self.data_version.read() if self.data_version else None
+        version, last_modified = current_version()
+        return (version, shared), last_modified
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.enabled
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(CACHEABLE_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        key = scope["path"] + "?" + "&".join(sorted(scope["query_string"].decode("latin-1").split("&")))
+        version, last_modified = self.current_version()
+        entry = self._lookup(key, version)
+        if entry is not None:
+            scope["route"] = entry.route
+            await self._send_cached(entry, request_headers, send)
+            return
+
+        captured = {"start": None, "body": [], "passthrough": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                headers = dict(message["headers"])
+                if message["status"] != 200 or b"content-length" not in headers:
+                    # Errors and streamed responses go straight through
+                    captured["passthrough"] = True
+                    await send(message)
+                    return
+                captured["start"] = message
+                return
+            if captured["passthrough"]:
+                await send(message)
+                return
+            captured["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._finish(key, version, last_modified, captured, scope, send)
+
+        await self.app(scope, receive, capture)
+
+    def _lookup(self, key: str, version: tuple) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version or entry.expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    async def _finish(self, key, version, last_modified, captured, scope, send):
+        body = b"".join(captured["body"])
+        start = captured["start"]
+        etag = _etag(body)
+        headers = [
+            (name, value) for name, value in start["headers"]
+            if name not in (b"etag", b"last-modified", b"cache-control")
+        ]
+        headers += [
+            (b"etag", etag),
+            (b"last-modified", _http_date(last_modified)),
+            # Let browsers keep the body but revalidate it on every use
+            (b"cache-control", b"no-cache"),
+        ]
+        entry = CachedResponse(
+            version, time.monotonic() + self.ttl, start["status"], headers, body, etag, last_modified,
+            scope.get("route"),
+        )
+        # Store only if no write happened while the response was being built
+        if len(body) <= CACHE_MAX_BODY_BYTES and self.current_version()[0] == version:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        await self._send_cached(entry, dict(scope["headers"]), send)
+
+    async def _send_cached(self, entry: CachedResponse, request_headers: dict, send):
+        if _not_modified(request_headers, entry.etag, entry.last_modified):
+            headers = [
+                (name, value) for name, value in entry.headers
+                if name in (b"etag", b"last-modified", b"cache-control")
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,99 @@
+from typing import Optional
+
+# Hebrew column layout of the committee's Excel report, shared by the
+# importer and the export endpoint. Kept free of pandas so the API can use it.
+
+# Excel column -> database field
+TEXT_COLUMNS = {
+    'שם מערכת / פרויקט': "system_name",
+    'אירגון': "organization",
+    'חטיבה דורשת': "requesting_unit",
+    'מנהל מוצר דורש': "requesting_product_manager",
+    'מגיש הבקשה': "applicant",
+    'חברות בנות': "subsidiaries",
+    'תיאור הפתרון': "solution_description",
+    'מסלול אישורים נדרש': "approval_path",
+    'סטטוס': "status",
+    'סיכום ועדה': "committee_summary",
+    'הערות ועדה': "committee_notes",
+    'גורם מאשר': "approver",
+    'הסבר - השפעת דליפת מידע': "explanation_data_leakage",
+    'הסבר - התאמת ספק שירותי הענן': "explanation_provider_fit",
+    'הסבר - כשל בשירות ענן': "explanation_service_failure",
+    'הסבר - עמידה בדין ורגולציה': "explanation_compliance",
+    'הסבר - היכולת לצמצם את השירות': "explanation_exit_strategy",
+    'סמנכ"ל טכנולוגיות': "vp_technologies",
+    'סמנכ"ל חטיבה עסקית': "vp_business_division",
+    'אישור הנהלה': "management_approval",
+    'אישור דירקטוריון': "board_approval",
+    'ענף CTO': "branch_cto",
+    'ענף תשתית': "branch_infrastructure",
+    'אגף אבטחת מידע': "dept_infosec",
+    'ניהול סיכונים טכנולוגיים': "tech_risk_management",
+    'נוספים': "additional_factors",
+    'גורמים נוספים': "other_factors",
+    'תיאור של ספק פתרון מחשוב הענן המוצע': "provider_description",
+}
+
+# Yes/no columns, stored as booleans
+FLAG_COLUMNS = {
+    'האם הספק מסווג כספק מיקור חוץ מהותי ': "is_significant_outsourcing",
+    'האם הספק מסווג כספק סייבר מהותי ': "is_significant_cyber",
+    'האם רלוונטי לתהליכי המשכיות עסקית/BIA': "is_bia_relevant",
+}
+
+# Integer columns; missing values become the given default
+INT_COLUMNS = {
+    '#': ("id", None),
+    'מספר קטלוגי ב-CMDB': ("cmdb_id", None),
+    'ציון כולל': ("total_score", 0),
+    'ציון - השפעת דליפת מידע (עד 30)': ("score_data_leakage", 0),
+    'ציון - התאמת ספק שירותי הענן (עד 15)': ("score_provider_fit", 0),
+    'ציון - כשל בשירות ענן (עד 30)': ("score_service_failure", 0),
+    'ציון - עמידה בדין ורגולציה (עד 15)': ("score_compliance", 0),
+    'ציון - היכולת לצמצם את השירות (עד 10)': ("score_exit_strategy", 0),
+}
+
+DATE_COLUMNS = {
+    'מועד הועדה': "committee_date",
+    'תאריך אישור': "approval_date",
+    'תאריך אישור סמנכ"לים': "vp_approval_date",
+    'תאריך אישור הנהלה': "management_approval_date",
+    'תאריך אישור דירקטוריון': "board_approval_date",
+}
+
+# Column order of exported files
+EXPORT_COLUMNS = (
+    [("#", "id")]
+    + list(TEXT_COLUMNS.items())
+    + list(FLAG_COLUMNS.items())
+    + [(column, field) for column, (field, _) in INT_COLUMNS.items() if field != "id"]
+    + list(DATE_COLUMNS.items())
+)
+
+# Accepted yes/no answers, lowercased. Anything longer ("לא ידוע") is not
+# read as an answer.
+YES_WORDS = {"כן", "yes", "y", "true", "1", "v"}
+NO_WORDS = {"לא", "no", "n", "false", "0"}
+
+def parse_flag(value) -> Optional[bool]:
+    # "כן" / "לא" as typed in the report, or booleans; blank is unknown.
+    # Raises ValueError for anything else.
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    answer = str(value).strip().strip(".!").lower()
+    if not answer:
+        return None
+    if answer in YES_WORDS:
+        return True
+    if answer in NO_WORDS:
+        return False
+    raise ValueError(f"Expected yes/no (כן/לא), got {value!r}")
+
+def flag_text(value: Optional[bool]) -> Optional[str]:
+    # Inverse of parse_flag for exported reports
+    if value is None:
+        return None
+    return "כן" if value else "לא"
@@ -1,14 +1,181 @@
-from sqlmodel import create_engine, SQLModel, Session
+from fastapi.concurrency import run_in_threadpool
+from functools import lru_cache
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 sqlite_file_name = os.getenv("DB_PATH", "database.db")
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{sqlite_file_name}")
+
+# SQLite tuning, overridable per deployment
+JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # safe with WAL; FULL fsyncs every commit
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", str(64 * 1024)))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+REPORTED_PRAGMAS = ["journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "query_only"]
+
+def _apply_pragmas(dbapi_connection, read_only: bool):
+    # Transactions are started explicitly in the "begin" listeners below
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        cursor.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KB}")
+    if read_only:
+        cursor.execute("PRAGMA query_only = 1")
+    cursor.close()
+
+def _configure_sqlite(writer, reader):
+    # Works for sync engines and for the sync_engine of async ones
+    @event.listens_for(writer, "connect")
+    def _connect_writer(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=False)
+
+    @event.listens_for(writer, "begin")
+    def _begin_writer(connection):
+        # Take the write lock up front: a deferred transaction that upgrades
+        # from read to write fails immediately instead of honouring busy_timeout
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(reader, "connect")
+    def _connect_reader(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=True)
+
+    @event.listens_for(reader, "begin")
+    def _begin_reader(connection):
+        # One snapshot for all queries of a request (e.g. page + total count)
+        connection.exec_driver_sql("BEGIN")
+
+def _engine_options(pool_size: int) -> dict:
+    return {"pool_size": pool_size, "max_overflow": 0, "pool_timeout": POOL_TIMEOUT}
+
+def create_engines(path: str):
+    # One writer connection, so writes in this process are serialized instead
+    # of failing with "database is locked", and a pool of read-only
+    # connections that under WAL keep reading while a write is in progress.
+    writer = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, **_engine_options(1)
+    )
+    reader = create_engine(
+        f"sqlite:///file:{path}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        **_engine_options(READ_POOL_SIZE),
+    )
+    _configure_sqlite(writer, reader)
+    return writer, reader
+
+def create_async_engines(url: str):
+    # Same layout as create_engines for aiosqlite; any other async URL (e.g.
+    # postgresql+asyncpg://...) gets one regular pool for reads and writes.
+    if not url.startswith("sqlite"):
+        engine = create_async_engine(url, pool_pre_ping=True)
+        return engine, engine
+    path = url.split(":///", 1)[1]
+    writer = create_async_engine(url, **_engine_options(1))
+    reader = create_async_engine(
+        f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true", **_engine_options(READ_POOL_SIZE)
+    )
+    _configure_sqlite(writer.sync_engine, reader.sync_engine)
+    return writer, reader
+
+engine, read_engine = create_engines(sqlite_file_name)
+
+def database_file(async_mode: bool) -> Optional[str]:
+    # SQLite file the app serves from, None for other databases
+    if not async_mode:
+        return sqlite_file_name
+    if ASYNC_DATABASE_URL.startswith("sqlite"):
+        return ASYNC_DATABASE_URL.split(":///", 1)[1]
+    return None
+
+@lru_cache(maxsize=None)
+def async_engines():
+    # Created on first use so the sync API does not need aiosqlite
+    return create_async_engines(ASYNC_DATABASE_URL)
 
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+def warm_pool(target, size: int) -> None:
+    # Open the pool's connections (and run their pragmas) now rather than
+    # on the first requests
+    connections = [target.connect() for _ in range(size)]
+    for connection in connections:
+        connection.close()
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+async def warm_pool_async(target, size: int) -> None:
+    connections = [await target.connect() for _ in range(size)]
+    for connection in connections:
+        await connection.close()
+
+def _read_settings(connection) -> dict:
+    if connection.dialect.name != "sqlite":
+        return {}
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in REPORTED_PRAGMAS}
+
+def database_settings(target) -> dict:
+    with target.connect() as connection:
+        return _read_settings(connection)
+
+def _report_settings(settings: dict) -> dict:
+    for role, values in settings.items():
+        logger.info("SQLite %s settings: %s", role, values)
+    journal_mode = settings["writer"].get("journal_mode")
+    if journal_mode and journal_mode.lower() != JOURNAL_MODE.lower():
+        logger.warning("Requested journal_mode=%s but the database uses %s", JOURNAL_MODE, journal_mode)
+    return settings
+
+def check_database_settings() -> dict:
+    # Effective settings of both engines, logged at startup. SQLite silently
+    # keeps the old journal mode when WAL is unavailable (e.g. network mounts).
+    return _report_settings({"writer": database_settings(engine), "reader": database_settings(read_engine)})
+
+async def check_database_settings_async() -> dict:
+    settings = {}
+    for role, target in zip(("writer", "reader"), async_engines()):
+        async with target.connect() as connection:
+            settings[role] = await connection.run_sync(_read_settings)
+    return _report_settings(settings)
+
+def dialect_insert(session: Session):
+    # INSERT construct with ON CONFLICT (upsert) support for the session's database
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
 
 def get_session():
+    # For requests that write
     with Session(engine) as session:
         yield session
+
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+async def get_async_session():
+    writer, _ = async_engines()
+    async with AsyncSession(writer, expire_on_commit=False) as session:
+        yield session
+
+async def get_async_read_session():
+    _, reader = async_engines()
+    async with AsyncSession(reader, expire_on_commit=False) as session:
+        yield session
+
+async def run_db(session, function, *args):
+    # Run synchronous database code from an async endpoint: in the session's
+    # greenlet for an AsyncSession, in the threadpool for a regular Session.
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(function, *args)
+    return await run_in_threadpool(function, session, *args)
@@ -0,0 +1,111 @@
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+from columns import EXPORT_COLUMNS, FLAG_COLUMNS, flag_text
+from database import run_db
+from listing import ServiceFilters, apply_filters
+from models import CloudService
+from search import apply_search
+
+# Rows are read in id order, one page at a time, within the read session's
+# single transaction: memory stays flat however large the export and every
+# page comes from the same snapshot.
+EXPORT_PAGE_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+EXPORT_FIELDS = [field for _, field in EXPORT_COLUMNS]
+EXPORT_HEADERS = [column for column, _ in EXPORT_COLUMNS]
+FLAG_FIELDS = set(FLAG_COLUMNS.values())
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "ndjson": "application/x-ndjson",
+}
+
+def export_page(session: Session, filters: ServiceFilters, search: Optional[str], after_id: Optional[int]) -> list:
+    query = select(*[getattr(CloudService, field) for field in EXPORT_FIELDS])
+    query = apply_search(apply_filters(query, filters), search, session)
+    query = query.order_by(None).order_by(CloudService.id)
+    if after_id is not None:
+        query = query.where(CloudService.id > after_id)
+    return session.exec(query.limit(EXPORT_PAGE_SIZE)).all()
+
+async def export_rows(session, filters: ServiceFilters, search: Optional[str]) -> AsyncIterator[tuple]:
+    after_id = None
+    while True:
+        rows = await run_db(session, export_page, filters, search, after_id)
+        for row in rows:
+            yield row
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        after_id = rows[-1][0]
+
+async def csv_chunks(rows: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+    # Byte order mark so Excel opens the Hebrew headers as UTF-8
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    async for row in rows:
+        writer.writerow(_report_row(row))
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+async def ndjson_chunks(rows: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+    # Keyed by field name, the format /services/bulk accepts
+    lines: List[str] = []
+    async for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, default=str))
+        if len(lines) >= EXPORT_PAGE_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def _report_row(row: tuple) -> list:
+    # Flags as the report writes them (כן/לא); dates stay dates
+    return [flag_text(value) if field in FLAG_FIELDS else value for field, value in zip(EXPORT_FIELDS, row)]
+
+async def xlsx_chunks(rows: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+    # openpyxl's write-only mode spools rows to a temporary file instead of
+    # keeping cells in memory. The finished workbook is a zip, so it is saved
+    # to disk and streamed from there.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.sheet_view.rightToLeft = True
+    sheet.append(EXPORT_HEADERS)
+    async for row in rows:
+        sheet.append(_report_row(row))
+
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    try:
+        await run_in_threadpool(workbook.save, path)
+        with open(path, "rb") as file:
+            while chunk := await run_in_threadpool(file.read, FLUSH_BYTES):
+                yield chunk
+    finally:
+        os.remove(path)
+
+WRITERS = {"csv": csv_chunks, "xlsx": xlsx_chunks, "ndjson": ndjson_chunks}
+
+def export_response(session, export_format: str, filters: ServiceFilters, search: Optional[str]) -> StreamingResponse:
+    filename = f"services-{datetime.date.today():%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        WRITERS[export_format](export_rows(session, filters, search)),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
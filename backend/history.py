@@ -0,0 +1,170 @@
+from datetime import date, datetime, timezone
+from typing import Dict, List, Mapping, Optional, Tuple
+from sqlalchemy import Connection, func, inspect
+from sqlmodel import Session, select
+from models import CloudService, ServiceChange, ServiceChangeRead
+from sync import SYNC_FIELDS, live_service
+
+# Every write to a service appends one ServiceChange row in the same
+# transaction, holding [old, new] for the fields it changed. Every
+# CHECKPOINT_INTERVAL-th version (and every create) also stores the full state
+# after the change, so the state at any time is the nearest checkpoint plus
+# fewer than CHECKPOINT_INTERVAL deltas: one indexed range read.
+CHECKPOINT_INTERVAL = 16
+
+TRACKED_FIELDS = [c.name for c in CloudService.__table__.columns if c.name != "id" and c.name not in SYNC_FIELDS]
+
+def service_state(service) -> dict:
+    return {name: getattr(service, name) for name in TRACKED_FIELDS}
+
+def _json_value(value):
+    # Dates are kept as ISO strings; the API models parse them back
+    return value.isoformat() if isinstance(value, date) else value
+
+def _diff(old: Mapping, new: Mapping) -> dict:
+    return {
+        name: [_json_value(old.get(name)), _json_value(new.get(name))]
+        for name in TRACKED_FIELDS
+        if old.get(name) != new.get(name)
+    }
+
+class ChangeLog:
+    # Collects the changes of one transaction and appends them in one insert
+    def __init__(self, changed_by: Optional[str] = None):
+        self.changed_by = changed_by
+        self._entries: List[Tuple[int, Optional[Mapping], Optional[Mapping], Optional[dict]]] = []
+
+    def add(
+        self, service_id: int, old: Optional[Mapping], new: Optional[Mapping], legacy_values: Optional[dict] = None
+    ) -> None:
+        self._entries.append((service_id, old, new, legacy_values))
+
+    def write(self, session: Session) -> None:
+        entries, self._entries = self._entries, []
+        if not entries:
+            return
+        ids = {service_id for service_id, _, _, _ in entries}
+        versions = dict(session.execute(
+            select(ServiceChange.service_id, func.max(ServiceChange.version))
+            .where(ServiceChange.service_id.in_(ids))
+            .group_by(ServiceChange.service_id)
+        ).all())
+        now = datetime.now(timezone.utc)
+        rows = []
+        # Only migrations have legacy values; other writes leave the column out
+        with_legacy = any(legacy for _, _, _, legacy in entries)
+        for service_id, old, new, legacy in entries:
+            if old is None and new is None:
+                continue
+            if old is None:
+                action, changes = "create", {}
+            elif new is None:
+                # Keep what was deleted, also for rows that predate the history
+                action, changes = "delete", _diff(old, {})
+            else:
+                action, changes = "update", _diff(old, new)
+                if not changes and not legacy:
+                    continue
+            version = versions.get(service_id, 0) + 1
+            versions[service_id] = version
+            checkpoint = new is not None and (action == "create" or version % CHECKPOINT_INTERVAL == 1)
+            row = {
+                "service_id": service_id,
+                "version": version,
+                "action": action,
+                "changed_at": now,
+                "changed_by": self.changed_by,
+                "changes": changes,
+                "snapshot": {name: _json_value(new.get(name)) for name in TRACKED_FIELDS} if checkpoint else None,
+            }
+            if with_legacy:
+                row["legacy_values"] = legacy or None
+            rows.append(row)
+        if rows:
+            session.execute(ServiceChange.__table__.insert(), rows)
+
+def add_legacy_values_column(connection: Connection) -> None:
+    # For databases whose change log predates legacy_values
+    table = ServiceChange.__table__
+    existing = {c["name"] for c in inspect(connection).get_columns(table.name)}
+    if "legacy_values" not in existing:
+        column_type = table.c.legacy_values.type.compile(connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN legacy_values {column_type}")
+
+def record_history(
+    session: Session, service_id: int, old: Optional[Mapping], new: Optional[Mapping], changed_by: Optional[str] = None
+) -> None:
+    log = ChangeLog(changed_by)
+    log.add(service_id, old, new)
+    log.write(session)
+
+def change_read(entry: ServiceChange) -> ServiceChangeRead:
+    changes = entry.changes
+    if entry.action == "create":
+        # A create stores the new row once, as its checkpoint
+        changes = {name: [None, value] for name, value in (entry.snapshot or {}).items() if value is not None}
+    return ServiceChangeRead(**entry.model_dump(exclude={"changes", "snapshot"}), changes=changes)
+
+def service_history(session: Session, service_id: int, offset: int = 0, limit: int = 100) -> List[ServiceChangeRead]:
+    entries = session.exec(
+        select(ServiceChange)
+        .where(ServiceChange.service_id == service_id)
+        .order_by(ServiceChange.version)
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    return [change_read(entry) for entry in entries]
+
+def changes_after(session: Session, after: int = 0, limit: int = 100) -> List[ServiceChangeRead]:
+    entries = session.exec(
+        select(ServiceChange).where(ServiceChange.id > after).order_by(ServiceChange.id).limit(limit)
+    ).all()
+    return [change_read(entry) for entry in entries]
+
+def _replay(entries: List[ServiceChange]) -> Optional[dict]:
+    # Entries in version order, starting at a checkpoint or a delete
+    state: Optional[dict] = None
+    for entry in entries:
+        if entry.snapshot is not None:
+            state = dict(entry.snapshot)
+        elif entry.action == "delete":
+            state = None
+        elif state is not None:
+            state.update({name: new for name, (_, new) in entry.changes.items()})
+    return state
+
+def state_as_of(session: Session, service_id: int, at: datetime) -> Optional[Dict]:
+    # None if the service did not exist at `at`
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    last = session.exec(
+        select(ServiceChange)
+        .where(ServiceChange.service_id == service_id, ServiceChange.changed_at <= at)
+        .order_by(ServiceChange.changed_at.desc(), ServiceChange.version.desc())
+        .limit(1)
+    ).first()
+    if last is None:
+        first = session.exec(
+            select(ServiceChange).where(ServiceChange.service_id == service_id).order_by(ServiceChange.version).limit(1)
+        ).first()
+        if first is None:
+            # Never changed since history started: the current row is the state
+            service = live_service(session, service_id)
+            return service_state(service) if service else None
+        if first.action == "create":
+            return None
+        # Row predates the history; undo its first logged change
+        state = {name: None for name in TRACKED_FIELDS}
+        state.update(first.snapshot or {})
+        state.update({name: old for name, (old, _) in first.changes.items()})
+        return state
+    entries = session.exec(
+        select(ServiceChange)
+        .where(
+            ServiceChange.service_id == service_id,
+            ServiceChange.version > last.version - CHECKPOINT_INTERVAL,
+            ServiceChange.version <= last.version,
+        )
+        .order_by(ServiceChange.version)
+    ).all()
+    return _replay(entries)
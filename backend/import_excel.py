@@ -1,126 +1,146 @@
 import pandas as pd
 import requests
 import os
+import sys
+import json
 import datetime
+import re
+from columns import DATE_COLUMNS, FLAG_COLUMNS, INT_COLUMNS, TEXT_COLUMNS, parse_flag
 
-def import_data():
-    file_path = "Easy_report-27.01.2026-1311169718.xlsx"
-    api_url = "http://localhost:8000/services/"
-    
+API_URL = "http://localhost:8000/services/bulk"
+BATCH_SIZE = 1000
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+# Year first (ISO and the like): year-month-day whatever the day, as
+# pandas reads them in a column
+YEAR_FIRST = re.compile(r"\s*\d{4}[-/.]\d{1,2}[-/.]\d{1,2}(?!\d)")
+
+def parse_date(date_val):
+    if date_val is None or pd.isna(date_val) or date_val == "":
+        return None
+    if isinstance(date_val, datetime.datetime):
+        return date_val.date().isoformat()
+    try:
+        # Try parsing DD/MM/YYYY
+        dayfirst = not (isinstance(date_val, str) and YEAR_FIRST.match(date_val))
+        return pd.to_datetime(date_val, dayfirst=dayfirst).date().isoformat()
+    except (ValueError, TypeError, OverflowError):
+        return str(date_val)
+
+def parse_date_column(series: pd.Series) -> pd.Series:
+    # Column-wise parse_date: datetimes and DD/MM/YYYY strings become ISO
+    # dates, anything unparseable is kept as its original text.
+    series = series.astype(object).where(series.notna(), None)
+    is_datetime = series.map(lambda v: isinstance(v, (datetime.datetime, datetime.date)))
+    parsed = pd.Series([None] * len(series), index=series.index, dtype=object)
+    if is_datetime.any():
+        parsed[is_datetime] = pd.to_datetime(series[is_datetime]).dt.date.map(datetime.date.isoformat)
+    text = series[~is_datetime & series.notna()].astype(str).str.strip()
+    text = text[text != ""]
+    if not text.empty:
+        dates = pd.to_datetime(text, dayfirst=True, errors="coerce", format="mixed")
+        parsed[text.index] = dates.dt.date.map(
+            lambda d: d.isoformat(), na_action="ignore"
+        ).where(dates.notna(), text)
+    return parsed
+
+def iso_date_or_none(value):
+    # What parse_date could not turn into a date has no place in a date column
+    return value if isinstance(value, str) and ISO_DATE.fullmatch(value) else None
+
+def flag_or_none(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    try:
+        return parse_flag(value)
+    except ValueError:
+        return None
+
+def map_columns(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=df.index)
+    for col, field in TEXT_COLUMNS.items():
+        if col in df:
+            text = df[col].where(df[col].notna()).astype("string").str.strip()
+            out[field] = text.where(text != "")
+        else:
+            out[field] = None
+    for col, (field, default) in INT_COLUMNS.items():
+        if col in df:
+            numbers = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        else:
+            numbers = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        out[field] = numbers.fillna(default) if default is not None else numbers
+    for col, field in DATE_COLUMNS.items():
+        out[field] = parse_date_column(df[col]).map(iso_date_or_none) if col in df else None
+    for col, field in FLAG_COLUMNS.items():
+        out[field] = df[col].astype(object).map(flag_or_none) if col in df else None
+    return out
+
+def to_records(df: pd.DataFrame) -> list:
+    # pandas NA/NaN -> None, numpy ints -> int, so rows serialize as JSON
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+def send_batches(records: list, api_url: str = API_URL, batch_size: int = BATCH_SIZE) -> tuple:
+    success = 0
+    failed = 0
+    with requests.Session() as http:
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            body = "\n".join(json.dumps(r, ensure_ascii=False) for r in batch).encode("utf-8")
+            try:
+                response = http.post(
+                    api_url,
+                    data=body,
+                    headers={"Content-Type": "application/x-ndjson"},
+                    params={"batch_size": batch_size},
+                )
+            except requests.RequestException as e:
+                print(f"Failed to post rows {start}-{start + len(batch) - 1}: {e}")
+                failed += len(batch)
+                continue
+            if response.status_code != 200:
+                print(f"Failed to post rows {start}-{start + len(batch) - 1}: {response.status_code} - {response.text}")
+                failed += len(batch)
+                continue
+            result = response.json()
+            for error in result["errors"]:
+                row = batch[error["index"]]
+                print(f"Failed to import {row['system_name']} (ID: {row['id']}): {error['error']}")
+            success += result["created"] + result["updated"]
+            failed += len(result["errors"])
+            print(f"Imported rows {start}-{start + len(batch) - 1}")
+    return success, failed
+
+def read_report(file_path: str) -> pd.DataFrame:
+    # Excel report, or a CSV export of /services/export (all text, so
+    # values are not reinterpreted before map_columns types them)
+    if file_path.lower().endswith(".csv"):
+        return pd.read_csv(file_path, dtype=str, encoding="utf-8-sig", keep_default_na=False)
+    return pd.read_excel(file_path)
+
+def import_data(file_path: str = "Easy_report-27.01.2026-1311169718.xlsx", api_url: str = API_URL):
     if not os.path.exists(file_path):
         print(f"Error: File not found at {file_path}")
         return
 
     print(f"Reading file: {file_path}")
-    
+
     try:
-        # Read Excel file
-        df = pd.read_excel(file_path)
+        df = read_report(file_path)
     except Exception as e:
-        print(f"Failed to read excel: {e}")
+        print(f"Failed to read file: {e}")
         return
 
     print(f"Found {len(df)} rows.")
-    
-    success = 0
-    failed = 0
-    
-    for index, row in df.iterrows():
-        try:
-            # Helper to safely get value
-            def get_val(col_name):
-                val = row.get(col_name)
-                if pd.isna(val):
-                    return None
-                return val
-
-            # Date Parsing Helper
-            def parse_date(date_val):
-                if not date_val:
-                    return None
-                if isinstance(date_val, datetime.datetime):
-                    return date_val.date().isoformat()
-                try:
-                    # Try parsing DD/MM/YYYY
-                    return pd.to_datetime(date_val, dayfirst=True).date().isoformat()
-                except:
-                    return str(date_val)
-
-            # Map Excel columns to Database fields
-            payload = {
-                "id": int(get_val('#')) if get_val('#') is not None else None,
-                "system_name": str(get_val('שם מערכת / פרויקט')).strip() if get_val('שם מערכת / פרויקט') else None,
-                "organization": str(get_val('אירגון')).strip() if get_val('אירגון') else None,
-                "committee_date": parse_date(get_val('מועד הועדה')),
-                "requesting_unit": str(get_val('חטיבה דורשת')).strip() if get_val('חטיבה דורשת') else None,
-                "requesting_product_manager": str(get_val('מנהל מוצר דורש')).strip() if get_val('מנהל מוצר דורש') else None,
-                "applicant": str(get_val('מגיש הבקשה')).strip() if get_val('מגיש הבקשה') else None,
-                "cmdb_id": int(get_val('מספר קטלוגי ב-CMDB')) if get_val('מספר קטלוגי ב-CMDB') is not None else None,
-                "subsidiaries": str(get_val('חברות בנות')).strip() if get_val('חברות בנות') else None,
-                "solution_description": str(get_val('תיאור הפתרון')).strip() if get_val('תיאור הפתרון') else None,
-                
-                "total_score": int(get_val('ציון כולל')) if get_val('ציון כולל') is not None else 0,
-                "approval_path": str(get_val('מסלול אישורים נדרש')).strip() if get_val('מסלול אישורים נדרש') else None,
-                "status": str(get_val('סטטוס')).strip() if get_val('סטטוס') else None,
-                "committee_summary": str(get_val('סיכום ועדה')).strip() if get_val('סיכום ועדה') else None,
-                "committee_notes": str(get_val('הערות ועדה')).strip() if get_val('הערות ועדה') else None,
-                "approver": str(get_val('גורם מאשר')).strip() if get_val('גורם מאשר') else None,
-                "approval_date": parse_date(get_val('תאריך אישור')),
-
-                "explanation_data_leakage": str(get_val('הסבר - השפעת דליפת מידע')).strip() if get_val('הסבר - השפעת דליפת מידע') else None,
-                "score_data_leakage": int(get_val('ציון - השפעת דליפת מידע (עד 30)')) if get_val('ציון - השפעת דליפת מידע (עד 30)') is not None else 0,
-                
-                "explanation_provider_fit": str(get_val('הסבר - התאמת ספק שירותי הענן')).strip() if get_val('הסבר - התאמת ספק שירותי הענן') else None,
-                "score_provider_fit": int(get_val('ציון - התאמת ספק שירותי הענן (עד 15)')) if get_val('ציון - התאמת ספק שירותי הענן (עד 15)') is not None else 0,
-                
-                "explanation_service_failure": str(get_val('הסבר - כשל בשירות ענן')).strip() if get_val('הסבר - כשל בשירות ענן') else None,
-                "score_service_failure": int(get_val('ציון - כשל בשירות ענן (עד 30)')) if get_val('ציון - כשל בשירות ענן (עד 30)') is not None else 0,
-                
-                "explanation_compliance": str(get_val('הסבר - עמידה בדין ורגולציה')).strip() if get_val('הסבר - עמידה בדין ורגולציה') else None,
-                "score_compliance": int(get_val('ציון - עמידה בדין ורגולציה (עד 15)')) if get_val('ציון - עמידה בדין ורגולציה (עד 15)') is not None else 0,
-                
-                "explanation_exit_strategy": str(get_val('הסבר - היכולת לצמצם את השירות')).strip() if get_val('הסבר - היכולת לצמצם את השירות') else None,
-                "score_exit_strategy": int(get_val('ציון - היכולת לצמצם את השירות (עד 10)')) if get_val('ציון - היכולת לצמצם את השירות (עד 10)') is not None else 0,
-
-                "vp_technologies": str(get_val('סמנכ"ל טכנולוגיות')).strip() if get_val('סמנכ"ל טכנולוגיות') else None,
-                "vp_business_division": str(get_val('סמנכ"ל חטיבה עסקית')).strip() if get_val('סמנכ"ל חטיבה עסקית') else None,
-                "vp_approval_date": parse_date(get_val('תאריך אישור סמנכ"לים')),
-                "management_approval": str(get_val('אישור הנהלה')).strip() if get_val('אישור הנהלה') else None,
-                "management_approval_date": parse_date(get_val('תאריך אישור הנהלה')),
-                "board_approval": str(get_val('אישור דירקטוריון')).strip() if get_val('אישור דירקטוריון') else None,
-                "board_approval_date": parse_date(get_val('תאריך אישור דירקטוריון')),
-
-                "branch_cto": str(get_val('ענף CTO')).strip() if get_val('ענף CTO') else None,
-                "branch_infrastructure": str(get_val('ענף תשתית')).strip() if get_val('ענף תשתית') else None,
-                "dept_infosec": str(get_val('אגף אבטחת מידע')).strip() if get_val('אגף אבטחת מידע') else None,
-                "tech_risk_management": str(get_val('ניהול סיכונים טכנולוגיים')).strip() if get_val('ניהול סיכונים טכנולוגיים') else None,
-                "additional_factors": str(get_val('נוספים')).strip() if get_val('נוספים') else None,
-                "other_factors": str(get_val('גורמים נוספים')).strip() if get_val('גורמים נוספים') else None,
-
-                "provider_description": str(get_val('תיאור של ספק פתרון מחשוב הענן המוצע')).strip() if get_val('תיאור של ספק פתרון מחשוב הענן המוצע') else None,
-                "is_significant_outsourcing": str(get_val('האם הספק מסווג כספק מיקור חוץ מהותי ')).strip() if get_val('האם הספק מסווג כספק מיקור חוץ מהותי ') else None,
-                "is_significant_cyber": str(get_val('האם הספק מסווג כספק סייבר מהותי ')).strip() if get_val('האם הספק מסווג כספק סייבר מהותי ') else None,
-                "is_bia_relevant": str(get_val('האם רלוונטי לתהליכי המשכיות עסקית/BIA')).strip() if get_val('האם רלוונטי לתהליכי המשכיות עסקית/BIA') else None,
-            }
-
-            if not payload["system_name"]:
-                 print(f"Skipping row {index}: Missing system name")
-                 continue
-
-            print(f"Posting: {payload['system_name']} (ID: {payload['id']})")
-            response = requests.post(api_url, json=payload)
-            
-            if response.status_code in [200, 201]:
-                success += 1
-            else:
-                print(f"Failed to post {payload['system_name']}: {response.status_code} - {response.text}")
-                failed += 1
-                
-        except Exception as e:
-            print(f"Error processing row {index}: {e}")
-            failed += 1
-            
+
+    mapped = map_columns(df)
+    missing_name = mapped["system_name"].isna()
+    for index in mapped.index[missing_name]:
+        print(f"Skipping row {index}: Missing system name")
+
+    success, failed = send_batches(to_records(mapped[~missing_name]), api_url)
     print(f"Import complete. Success: {success}, Failed: {failed}")
 
 if __name__ == "__main__":
-    import_data()
\ No newline at end of file
+    import_data(*sys.argv[1:])
@@ -0,0 +1,213 @@
+import base64
+import json
+from datetime import date
+from dataclasses import dataclass, field
+from typing import List, Optional
+from fastapi import HTTPException, Query, Response
+from pydantic_core import to_json
+from sqlalchemy import Date, and_, func, tuple_
+from sqlmodel import Session, select
+from models import CloudService, CloudServiceSummary
+from scoring import IMPACT_LEVELS
+from sync import LIVE
+
+# Columns the list endpoint may be sorted by. Each has a (column, id) index
+# in models.py so that a sorted page is a range scan of that index.
+SORT_FIELDS = [
+    "id", "system_name", "organization", "committee_date", "status", "total_score", "impact_level",
+    "approval_date",
+]
+
+# Filters on yes/no columns; each has a (flag, id) index
+FLAG_FILTERS = ["is_significant_outsourcing", "is_significant_cyber", "is_bia_relevant"]
+
+# Inclusive date-range filters: parameter prefix -> column
+DATE_RANGES = {"committee": "committee_date", "approved": "approval_date"}
+
+# Columns of the compact inventory view (`fields=summary`)
+SUMMARY_FIELDS = list(CloudServiceSummary.model_fields)
+
+@dataclass
+class ServiceFilters:
+    status: List[str] = field(default_factory=list)
+    organization: List[str] = field(default_factory=list)
+    approval_path: List[str] = field(default_factory=list)
+    requesting_unit: List[str] = field(default_factory=list)
+    impact: List[str] = field(default_factory=list)
+    min_score: Optional[int] = None
+    max_score: Optional[int] = None
+    committee_from: Optional[date] = None
+    committee_to: Optional[date] = None
+    approved_from: Optional[date] = None
+    approved_to: Optional[date] = None
+    is_significant_outsourcing: Optional[bool] = None
+    is_significant_cyber: Optional[bool] = None
+    is_bia_relevant: Optional[bool] = None
+
+def service_filters(
+    status: List[str] = Query(default=[]),
+    organization: List[str] = Query(default=[]),
+    approval_path: List[str] = Query(default=[]),
+    requesting_unit: List[str] = Query(default=[]),
+    impact: List[str] = Query(default=[]),
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    committee_from: Optional[date] = None,
+    committee_to: Optional[date] = None,
+    approved_from: Optional[date] = None,
+    approved_to: Optional[date] = None,
+    is_significant_outsourcing: Optional[bool] = None,
+    is_significant_cyber: Optional[bool] = None,
+    is_bia_relevant: Optional[bool] = None,
+) -> ServiceFilters:
+    levels = [level for level, _ in IMPACT_LEVELS]
+    unknown = [level for level in impact if level not in levels]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown impact level {unknown[0]!r}; expected one of {levels}",
+        )
+    return ServiceFilters(
+        status=status,
+        organization=organization,
+        approval_path=approval_path,
+        requesting_unit=requesting_unit,
+        impact=impact,
+        min_score=min_score,
+        max_score=max_score,
+        committee_from=committee_from,
+        committee_to=committee_to,
+        approved_from=approved_from,
+        approved_to=approved_to,
+        is_significant_outsourcing=is_significant_outsourcing,
+        is_significant_cyber=is_significant_cyber,
+        is_bia_relevant=is_bia_relevant,
+    )
+
+def apply_filters(query, filters: ServiceFilters):
+    query = query.where(LIVE)
+    for name in ("status", "organization", "approval_path", "requesting_unit"):
+        values = getattr(filters, name)
+        if values:
+            query = query.where(getattr(CloudService, name).in_(values))
+    if filters.impact:
+        query = query.where(CloudService.impact_level.in_(filters.impact))
+    if filters.min_score is not None:
+        query = query.where(CloudService.total_score >= filters.min_score)
+    if filters.max_score is not None:
+        query = query.where(CloudService.total_score <= filters.max_score)
+    for prefix, name in DATE_RANGES.items():
+        column = getattr(CloudService, name)
+        start, end = getattr(filters, f"{prefix}_from"), getattr(filters, f"{prefix}_to")
+        if start is not None:
+            query = query.where(column >= start)
+        if end is not None:
+            query = query.where(column <= end)
+    for name in FLAG_FILTERS:
+        value = getattr(filters, name)
+        if value is not None:
+            query = query.where(getattr(CloudService, name) == value)
+    return query
+
+@dataclass
+class SortOrder:
+    field: str
+    descending: bool
+
+def parse_sort(sort: str) -> SortOrder:
+    name = sort[1:] if sort.startswith("-") else sort
+    if name not in SORT_FIELDS:
+        raise HTTPException(
+            status_code=400, detail=f"Cannot sort by {name!r}; expected one of {SORT_FIELDS}"
+        )
+    return SortOrder(field=name, descending=sort.startswith("-"))
+
+def apply_sort(query, order: SortOrder):
+    # NULLs sort first ascending and last descending (SQLite's native order),
+    # written out explicitly so other databases page identically. Replaces
+    # the relevance order of a search.
+    query = query.order_by(None)
+    column = getattr(CloudService, order.field)
+    if order.field == "id":
+        return query.order_by(column.desc() if order.descending else column.asc())
+    if order.descending:
+        return query.order_by(column.desc().nulls_last(), CloudService.id.desc())
+    return query.order_by(column.asc().nulls_first(), CloudService.id.asc())
+
+def encode_cursor(order: SortOrder, service: CloudService) -> str:
+    payload = {"s": order.field, "d": order.descending, "v": getattr(service, order.field), "id": service.id}
+    return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order: SortOrder) -> dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        valid = isinstance(payload, dict) and isinstance(payload.get("id"), int)
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("s") != order.field or payload.get("d") != order.descending:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+    return payload
+
+def _cursor_segments(order: SortOrder, cursor: str) -> list:
+    # Rows strictly after (value, id) in the sort order, as one or two
+    # conditions that are each a range seek on the (column, id) index. The
+    # NULL block (first ascending, last descending) is its own segment
+    # because a single OR-ed condition would make SQLite scan from the start.
+    payload = decode_cursor(cursor, order)
+    column = getattr(CloudService, order.field)
+    value, last_id = payload["v"], payload["id"]
+    if value is not None and isinstance(column.type, Date):
+        try:
+            value = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    if order.field == "id":
+        return [column < last_id if order.descending else column > last_id]
+    key = tuple_(column, CloudService.id)
+    if order.descending:
+        if value is None:
+            return [and_(column.is_(None), CloudService.id < last_id)]
+        return [key < tuple_(value, last_id), column.is_(None)]
+    if value is None:
+        return [and_(column.is_(None), CloudService.id > last_id), column.is_not(None)]
+    return [key > tuple_(value, last_id)]
+
+def fetch_after_cursor(session: Session, query, order: SortOrder, cursor: str, limit: int) -> list:
+    rows = []
+    for condition in _cursor_segments(order, cursor):
+        rows += session.exec(query.where(condition).limit(limit - len(rows))).all()
+        if len(rows) >= limit:
+            break
+    return rows
+
+def parse_fields(fields: str) -> List[str]:
+    if fields.strip() == "summary":
+        names = SUMMARY_FIELDS
+    else:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+    columns = CloudService.__table__.columns
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field {unknown[0]!r}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+def projected_columns(fields: List[str], order: Optional[SortOrder]) -> list:
+    # The sort key is needed to build the next cursor even if not requested
+    names = list(fields)
+    if order is not None and order.field not in names:
+        names.append(order.field)
+    return [getattr(CloudService, name) for name in names]
+
+def projected_response(rows: list, fields: List[str], response: Response) -> Response:
+    body = [{name: getattr(row, name) for name in fields} for row in rows]
+    # pydantic's encoder, so dates and datetimes read the same as in full responses
+    return Response(
+        content=to_json(body),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
+
+def count_services(session: Session, query) -> int:
+    return session.exec(select(func.count()).select_from(query.order_by(None).subquery())).one()
@@ -1,17 +1,90 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+import startup  # first, so the imports below are timed
+import json
+import os
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, FastAPI, Depends, Header, HTTPException, Query, Request, Response
 from sqlmodel import Session, select
-from typing import List, Optional
-from database import create_db_and_tables, get_session
-from models import CloudService, CloudServiceCreate, CloudServiceRead, CloudServiceUpdate
+from typing import List, Literal, Optional
+from database import (
+    READ_POOL_SIZE, async_engines, check_database_settings, check_database_settings_async, database_file, engine,
+    get_read_session, get_session, read_engine, run_db, warm_pool, warm_pool_async,
+)
+from migrations import migrate_database, migrate_database_async
+from models import (
+    CloudService, CloudServiceCreate, CloudServiceRead, CloudServiceUpdate, CloudServiceSearchHit, BulkResult, BulkRowError,
+    ServiceChangeRead, ServiceChanges, ServiceStats, SimilarService,
+)
+from search import apply_search, search_hits
+from bulk import BULK_BATCH_SIZE, index_imported, ingest_batch
+from scoring import apply_scores
+from stats import read_stats, record_change, rollup_snapshot
+from history import changes_after, record_history, service_history, service_state, state_as_of
+from sync import LIVE, live_service, parse_token, read_changes, soft_delete, stamp
+from similarity import (
+    SIMILAR_THRESHOLD, compute_signature, find_duplicates, index_services, remove_signatures, similar_services,
+    text_changed,
+)
+from listing import (
+    ServiceFilters, apply_filters, apply_sort, count_services, encode_cursor, fetch_after_cursor,
+    parse_fields, parse_sort, projected_columns, projected_response, service_filters,
+)
+from async_routes import async_router
+from export import export_response
+from cache import ResponseCacheMiddleware, bump_version
+from metrics import MetricsMiddleware, render_metrics
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+startup.imports_done()
+
+# DB_ASYNC=1 serves the same routes as async handlers on an async engine
+ASYNC_MODE = os.getenv("DB_ASYNC", "0") == "1"
+
+def _warm_up(session: Session) -> None:
+    # First use of the common paths: mapper configuration, SQL compilation
+    # (cached per statement shape), response serialization, signature hashing
+    for service in session.exec(select(CloudService).where(LIVE).limit(1)).all():
+        CloudServiceRead.model_validate(service).model_dump_json()
+    read_stats(session)
+    compute_signature({"system_name": "warm-up"})
+
+def prewarm() -> None:
+    warm_pool(engine, 1)
+    warm_pool(read_engine, READ_POOL_SIZE)
+    with Session(read_engine) as session:
+        _warm_up(session)
+
+async def prewarm_async() -> None:
+    writer, reader = async_engines()
+    await warm_pool_async(writer, 1)
+    await warm_pool_async(reader, READ_POOL_SIZE)
+    async with AsyncSession(reader) as session:
+        await session.run_sync(_warm_up)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    with startup.phase("migrations"):
+        migrate_database()
+    with startup.phase("database settings"):
+        check_database_settings()
+    with startup.phase("prewarm"):
+        prewarm()
+    startup.mark_ready()
+    yield
+
+@asynccontextmanager
+async def async_lifespan(app: FastAPI):
+    with startup.phase("migrations"):
+        await migrate_database_async()
+    with startup.phase("database settings"):
+        await check_database_settings_async()
+    with startup.phase("prewarm"):
+        await prewarm_async()
+    startup.mark_ready()
     yield
 
-app = FastAPI(lifespan=lifespan)
+router = APIRouter()
 
 origins = [
     "http://localhost:5173",
@@ -19,75 +92,309 @@ origins = [
     "http://localhost:3000",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "Cloud Governance Committee API"}
 
-@app.post("/services/", response_model=CloudServiceRead)
-def create_service(service: CloudServiceCreate, session: Session = Depends(get_session)):
+@router.post("/services/", response_model=CloudServiceRead)
+def create_service(
+    service: CloudServiceCreate,
+    response: Response,
+    changed_by: Optional[str] = Header(default=None, alias="X-User"),
+    session: Session = Depends(get_session)
+):
     db_service = CloudService.model_validate(service)
+    existing = session.get(CloudService, service.id) if service.id is not None else None
+    if existing is not None and existing.deleted_at is None:
+        raise HTTPException(status_code=409, detail="Service already exists")
+    if existing is not None:
+        # The id of a deleted service: bring the tombstone back, as /services/bulk does
+        db_service = session.merge(db_service)
+        db_service.deleted_at = None
+    apply_scores(db_service)
+    stamp(session, db_service)
+    # Near-duplicates already in the inventory (often the same SaaS requested
+    # by another unit); the service is still created
+    duplicates = find_duplicates(session, service.model_dump())
+    if duplicates:
+        response.headers["X-Possible-Duplicates"] = ",".join(str(d["id"]) for d in duplicates)
     session.add(db_service)
+    session.flush()
+    state = service_state(db_service)
+    record_change(session, None, rollup_snapshot(db_service))
+    record_history(session, db_service.id, None, state, changed_by)
+    index_services(session, {db_service.id: state})
     session.commit()
+    bump_version()
     session.refresh(db_service)
     return db_service
 
-@app.get("/services/", response_model=List[CloudServiceRead])
+async def _ndjson_rows(request: Request):
+    buffer = b""
+    index = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if buffer.strip():
+        yield index, buffer
+
+@router.post("/services/bulk", response_model=BulkResult)
+async def bulk_upsert_services(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    batch_size: int = Query(default=BULK_BATCH_SIZE, ge=1, le=5000),
+    changed_by: Optional[str] = Header(default=None, alias="X-User"),
+    session: Session = Depends(get_session)
+):
+    # Accepts a JSON array, or NDJSON (one object per line) which is
+    # consumed as a stream and written batch by batch.
+    result = BulkResult()
+    try:
+        await _ingest_request(request, batch_size, changed_by, session, result)
+    finally:
+        # Batches commit one by one, so even a failed request may have written
+        bump_version()
+    # On the request's session, which is closed by then; a closed session
+    # starts a new transaction when used again
+    background_tasks.add_task(run_db, session, index_imported, list(result.ids))
+    result.errors.sort(key=lambda e: e.index)
+    return result
+
+async def _ingest_request(
+    request: Request, batch_size: int, changed_by: Optional[str], session: Session, result: BulkResult
+):
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        batch = []
+        async for index, line in _ndjson_rows(request):
+            try:
+                batch.append((index, json.loads(line)))
+            except ValueError as e:
+                result.errors.append(BulkRowError(index=index, error=f"Invalid JSON: {e}"))
+            if len(batch) >= batch_size:
+                await run_db(session, ingest_batch, batch, result, changed_by)
+                batch = []
+        if batch:
+            await run_db(session, ingest_batch, batch, result, changed_by)
+    else:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for start in range(0, len(rows), batch_size):
+            batch = list(enumerate(rows[start:start + batch_size], start))
+            await run_db(session, ingest_batch, batch, result, changed_by)
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    # Prometheus text exposition format
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/services/", response_model=List[CloudServiceRead])
 def read_services(
+    response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = Query(default=100, ge=1, le=1000),
     search: Optional[str] = "",
-    session: Session = Depends(get_session)
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    fields: Optional[str] = Query(
+        default=None,
+        description="Comma-separated columns to return (id is always included), or `summary`",
+    ),
+    filters: ServiceFilters = Depends(service_filters),
+    session: Session = Depends(get_read_session)
 ):
-    query = select(CloudService)
+    # Pagination: pass the X-Next-Cursor header of a page as `cursor` to get
+    # the next one (keyset on sort key + id). Without a cursor, `offset` works
+    # as before. A search without an explicit sort is ordered by relevance.
+    order = parse_sort(sort or "id") if sort or not search else None
+    if cursor and order is None:
+        raise HTTPException(status_code=400, detail="Cursor pagination requires an explicit sort when searching")
+    projection = parse_fields(fields) if fields else None
+
+    if projection:
+        query = select(*projected_columns(projection, order))
+    else:
+        query = select(CloudService)
+    query = apply_filters(query, filters)
     if search:
-        # Search in system_name or applicant
-        query = query.where(
-            (CloudService.system_name.contains(search)) | 
-            (CloudService.applicant.contains(search))
-        )
-    query = query.offset(offset).limit(limit)
-    services = session.exec(query).all()
+        # Full-text search over names and free-text fields, best matches first
+        query = apply_search(query, search, session)
+    if include_total:
+        response.headers["X-Total-Count"] = str(count_services(session, query))
+
+    if order is None:
+        services = session.exec(query.offset(offset).limit(limit)).all()
+    else:
+        query = apply_sort(query, order)
+        if cursor:
+            services = fetch_after_cursor(session, query, order, cursor, limit)
+        else:
+            services = session.exec(query.offset(offset).limit(limit)).all()
+        if len(services) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(order, services[-1])
+
+    if projection:
+        # Only the selected columns were read; serialize them as-is rather than
+        # validating partial rows against CloudServiceRead.
+        return projected_response(services, projection, response)
     return services
 
-@app.get("/services/{service_id}", response_model=CloudServiceRead)
-def read_service(service_id: int, session: Session = Depends(get_session)):
-    service = session.get(CloudService, service_id)
+@router.get("/services/search", response_model=List[CloudServiceSearchHit])
+def search_services(
+    q: str,
+    offset: int = 0,
+    limit: int = Query(default=20, ge=1, le=100),
+    session: Session = Depends(get_read_session)
+):
+    return search_hits(session, q, offset, limit)
+
+@router.get("/services/changes", response_model=ServiceChanges)
+def read_service_changes(
+    since: Optional[str] = Query(default=None, description="`token` of the previous call; omit for a full sync"),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    session: Session = Depends(get_read_session)
+):
+    # Services created, updated or deleted since the token, in write order.
+    # Keep calling with the returned token while has_more is true.
+    return read_changes(session, parse_token(since), limit)
+
+@router.get("/services/export")
+async def export_services(
+    export_format: Literal["csv", "xlsx", "ndjson"] = Query(default="csv", alias="format"),
+    search: Optional[str] = "",
+    filters: ServiceFilters = Depends(service_filters),
+    session: Session = Depends(get_read_session)
+):
+    # Whole inventory (or the filtered part of it) in the Hebrew column layout
+    # of the committee report; ndjson uses field names, as /services/bulk does.
+    return export_response(session, export_format, filters, search)
+
+@router.get("/history", response_model=List[ServiceChangeRead])
+def read_change_feed(
+    response: Response,
+    after: int = Query(default=0, ge=0, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: Session = Depends(get_read_session)
+):
+    # Every recorded change across all services, oldest first
+    changes = changes_after(session, after, limit)
+    response.headers["X-Next-Cursor"] = str(changes[-1].id if changes else after)
+    return changes
+
+@router.get("/stats", response_model=ServiceStats)
+def get_stats(session: Session = Depends(get_read_session)):
+    # Service count and average total_score overall and per organization,
+    # requesting_unit, status, approval_path, impact_level and committee month
+    return read_stats(session)
+
+@router.get("/services/{service_id}", response_model=CloudServiceRead)
+def read_service(service_id: int, session: Session = Depends(get_read_session)):
+    service = live_service(session, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     return service
 
-@app.patch("/services/{service_id}", response_model=CloudServiceRead)
+@router.get("/services/{service_id}/history", response_model=List[ServiceChangeRead])
+def read_service_history(
+    service_id: int,
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    session: Session = Depends(get_read_session)
+):
+    return service_history(session, service_id, offset, limit)
+
+@router.get("/services/{service_id}/as-of", response_model=CloudServiceRead)
+def read_service_as_of(service_id: int, at: datetime, session: Session = Depends(get_read_session)):
+    # The service as it was at `at` (UTC unless an offset is given)
+    state = state_as_of(session, service_id, at)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Service did not exist at that time")
+    return CloudServiceRead(id=service_id, **state)
+
+@router.get("/services/{service_id}/similar", response_model=List[SimilarService])
+def read_similar_services(
+    service_id: int,
+    threshold: float = Query(default=SIMILAR_THRESHOLD, ge=0, le=1, description="Minimum similarity, 0-1"),
+    limit: int = Query(default=10, ge=1, le=100),
+    session: Session = Depends(get_read_session)
+):
+    # Services with a similar name and descriptions, most similar first
+    if not live_service(session, service_id):
+        raise HTTPException(status_code=404, detail="Service not found")
+    return similar_services(session, service_id, threshold, limit)
+
+@router.patch("/services/{service_id}", response_model=CloudServiceRead)
 def update_service(
     service_id: int,
     service: CloudServiceUpdate,
+    changed_by: Optional[str] = Header(default=None, alias="X-User"),
     session: Session = Depends(get_session)
 ):
-    db_service = session.get(CloudService, service_id)
+    db_service = live_service(session, service_id)
     if not db_service:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    before = service_state(db_service)
     service_data = service.model_dump(exclude_unset=True)
     for key, value in service_data.items():
         setattr(db_service, key, value)
+    apply_scores(db_service)
+    stamp(session, db_service)
     
     session.add(db_service)
+    after = service_state(db_service)
+    record_change(session, before, after)
+    record_history(session, service_id, before, after, changed_by)
+    if text_changed(before, after):
+        index_services(session, {service_id: after})
     session.commit()
+    bump_version()
     session.refresh(db_service)
     return db_service
 
-@app.delete("/services/{service_id}")
-def delete_service(service_id: int, session: Session = Depends(get_session)):
-    service = session.get(CloudService, service_id)
+@router.delete("/services/{service_id}")
+def delete_service(
+    service_id: int,
+    changed_by: Optional[str] = Header(default=None, alias="X-User"),
+    session: Session = Depends(get_session)
+):
+    service = live_service(session, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    session.delete(service)
+    record_change(session, rollup_snapshot(service), None)
+    record_history(session, service_id, service_state(service), None, changed_by)
+    remove_signatures(session, [service_id])
+    # Kept as a tombstone so /services/changes can report the delete
+    soft_delete(session, service)
+    session.add(service)
     session.commit()
+    bump_version()
     return {"ok": True}
+
+def create_app(async_mode: bool = ASYNC_MODE) -> FastAPI:
+    app = FastAPI(lifespan=async_lifespan if async_mode else lifespan)
+    # Added first so it runs inside CORS and cached responses get CORS headers too
+    app.add_middleware(ResponseCacheMiddleware, database_path=database_file(async_mode))
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Possible-Duplicates", "ETag", "Last-Modified"],
+    )
+    # Outermost, so latency includes every other middleware and cache hits
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(async_router(router) if async_mode else router)
+    return app
+
+app = create_app()
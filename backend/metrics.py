@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import startup
+
+logger = logging.getLogger(__name__)
+
+# Request and SQL metrics in Prometheus text format (GET /metrics), kept in
+# process memory. With several workers each reports its own numbers.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# X-Profile: 1 returns a pyinstrument profile of the request instead of its
+# response. Off unless enabled, since it exposes code paths and timings.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.items())
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.items()), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [f"{self.name}{_format_labels(k)} {v}" for k, v in values]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[tuple(labels.items())] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.items())
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = [counts, total + value]
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(tuple(labels.items()))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> list:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = super().render()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status")
+LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram("http_response_size_bytes", "HTTP response body size", SIZE_BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements run per HTTP request", QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request", LATENCY_BUCKETS)
+QUERY_TIME = Histogram("db_query_duration_seconds", "SQL statement latency", LATENCY_BUCKETS)
+SLOW_QUERIES = Counter("db_slow_queries_total", f"SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)")
+
+STARTUP_PHASES = Gauge("app_startup_phase_seconds", "Duration of each startup phase")
+STARTUP_MILESTONES = Gauge("app_startup_milestone_seconds", "Time from the start of main.py's imports to ready and first request")
+IMPORTS = Gauge("app_import_seconds", "Import time of each module main.py imports, including its own imports")
+
+ALL_METRICS = [
+    REQUESTS, LATENCY, RESPONSE_SIZE, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME, QUERY_TIME, SLOW_QUERIES,
+    STARTUP_PHASES, STARTUP_MILESTONES, IMPORTS,
+]
+
+def _update_startup_gauges() -> None:
+    report = startup.REPORT
+    for name, seconds in report.imports:
+        IMPORTS.set(seconds, module=name)
+    for name, seconds in report.phases.items():
+        STARTUP_PHASES.set(seconds, phase=name)
+    for milestone in ("ready", "first_request"):
+        if getattr(report, milestone) is not None:
+            STARTUP_MILESTONES.set(getattr(report, milestone), milestone=milestone)
+
+def render_metrics() -> str:
+    _update_startup_gauges()
+    return "\n".join(line for metric in ALL_METRICS for line in metric.render()) + "\n"
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Set by the middleware. Threadpool and greenlet calls made for the request
+# run in a copy of its context, so they update the same object.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Every engine (sync, async, read and write) runs its statements through
+# these; registered on the Engine class so engines created later are covered.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    QUERY_TIME.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so pooled connections do not collect one per error
+    if context.connection is not None and context.execution_context is not None:
+        started = context.connection.info.get("query_start")
+        if started:
+            started.pop()
+
+def _route_label(scope) -> str:
+    # The path template, so /services/1 and /services/2 share one series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if PROFILING_ENABLED and (dict(scope["headers"]).get(b"x-profile") == b"1"):
+            await self._profile(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = [500]
+        size = [0]
+
+        async def measure(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            labels = {"method": scope["method"], "route": _route_label(scope)}
+            REQUESTS.inc(**labels, status=str(status[0]))
+            LATENCY.observe(elapsed, **labels)
+            RESPONSE_SIZE.observe(size[0], **labels)
+            REQUEST_QUERIES.observe(stats.queries, **labels)
+            REQUEST_DB_TIME.observe(stats.db_seconds, **labels)
+            startup.mark_request_served()
+
+    async def _profile(self, scope, receive, send):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            body = b"pyinstrument is not installed"
+            await send({"type": "http.response.start", "status": 501, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def discard(message):
+            pass
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+        body = profiler.output_html().encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/html; charset=utf-8")]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,102 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from sqlalchemy import Connection, func, inspect, insert, select
+import schema_v1
+from database import async_engines, engine
+from history import add_legacy_values_column
+from models import SchemaMigration
+from search import create_search_index
+from similarity import index_missing_signatures
+from sync import number_existing_rows
+from typed_columns import convert_typed_columns
+
+logger = logging.getLogger(__name__)
+
+# Versioned schema changes, applied in order and recorded in
+# schemamigration, so a start with an up-to-date database reads one row
+# instead of inspecting and re-creating the schema. Databases from before
+# versioning have no record and run every step, so each step must leave a
+# database that already has its change as it is. To change the schema,
+# append a step; never edit one that has shipped. Step 1 creates the frozen
+# schema of schema_v1.py, so later model changes each need a step of their own.
+# With MIGRATE_ON_STARTUP=0 the app only checks the version and
+# `python migrations.py` applies pending steps (e.g. once per deployment).
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+def _add_missing_columns(connection: Connection) -> None:
+    inspector = inspect(connection)
+    for table in schema_v1.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+def create_tables(connection: Connection) -> None:
+    # create_all skips tables that already exist, including their indexes;
+    # add any column or index introduced since the database file was created.
+    _add_missing_columns(connection)
+    schema_v1.metadata.create_all(connection)
+    for table in schema_v1.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "tables and indexes", create_tables),
+    (2, "typed date and flag columns", convert_typed_columns),
+    (3, "sync sequence numbers", number_existing_rows),
+    (4, "full-text search index", create_search_index),
+    (5, "similarity signatures", index_missing_signatures),
+    (6, "legacy values in the change history", add_legacy_values_column),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(SchemaMigration.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+def migrate(connection: Connection) -> List[int]:
+    # Applies pending steps in the caller's transaction; returns their versions
+    current = schema_version(connection)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        step(connection)
+        connection.execute(
+            insert(SchemaMigration).values(version=version, name=name, applied_at=datetime.now(timezone.utc))
+        )
+        logger.info("Applied migration %d (%s) in %.2fs", version, name, time.perf_counter() - started)
+        applied.append(version)
+    return applied
+
+def _startup(connection: Connection) -> List[int]:
+    if MIGRATE_ON_STARTUP:
+        return migrate(connection)
+    current = schema_version(connection)
+    if current < LATEST_VERSION:
+        logger.warning("Database schema is at version %d of %d; run `python migrations.py`", current, LATEST_VERSION)
+    return []
+
+def migrate_database() -> List[int]:
+    # On the writer, so workers starting together apply each step once
+    with engine.begin() as connection:
+        return _startup(connection)
+
+async def migrate_database_async() -> List[int]:
+    writer, _ = async_engines()
+    async with writer.begin() as connection:
+        return await connection.run_sync(_startup)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as connection:
+        applied = migrate(connection)
+    print(f"Applied {len(applied)} migrations; schema is at version {LATEST_VERSION}.")
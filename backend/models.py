@@ -1,11 +1,22 @@
-from typing import Optional
+from datetime import date, datetime
+from typing import Annotated, Any, Dict, List, Optional
+from pydantic import BeforeValidator
+from sqlalchemy import JSON, BigInteger, Column, Index, LargeBinary
 from sqlmodel import Field, SQLModel
+from columns import parse_flag
+
+def _blank_to_none(value):
+    return None if isinstance(value, str) and not value.strip() else value
+
+# Empty form inputs arrive as ""; flags also accept the report's כן/לא
+OptionalDate = Annotated[Optional[date], BeforeValidator(_blank_to_none)]
+Flag = Annotated[Optional[bool], BeforeValidator(parse_flag)]
 
 class CloudServiceBase(SQLModel):
     # Basic Info
     system_name: Optional[str] = Field(default=None)  # שם מערכת / פרויקט
     organization: Optional[str] = Field(default=None)  # אירגון
-    committee_date: Optional[str] = Field(default=None)  # מועד הועדה
+    committee_date: OptionalDate = Field(default=None)  # מועד הועדה
     requesting_unit: Optional[str] = Field(default=None)  # חטיבה דורשת
     requesting_product_manager: Optional[str] = Field(default=None)  # מנהל מוצר דורש
     applicant: Optional[str] = Field(default=None)  # מגיש הבקשה
@@ -14,13 +25,13 @@ class CloudServiceBase(SQLModel):
     solution_description: Optional[str] = Field(default=None)  # תיאור הפתרון
     
     # Scoring & Status
-    total_score: Optional[int] = Field(default=0)  # ציון כולל
+    total_score: Optional[int] = Field(default=0)  # ציון כולל (computed by the server, see scoring.py)
     approval_path: Optional[str] = Field(default=None)  # מסלול אישורים נדרש
     status: Optional[str] = Field(default=None)  # סטטוס
     committee_summary: Optional[str] = Field(default=None)  # סיכום ועדה
     committee_notes: Optional[str] = Field(default=None)  # הערות ועדה
     approver: Optional[str] = Field(default=None)  # גורם מאשר
-    approval_date: Optional[str] = Field(default=None)  # תאריך אישור
+    approval_date: OptionalDate = Field(default=None)  # תאריך אישור
 
     # Risk Questions & Explanations
     explanation_data_leakage: Optional[str] = Field(default=None)  # הסבר - השפעת דליפת מידע
@@ -41,11 +52,11 @@ class CloudServiceBase(SQLModel):
     # Additional Approvals
     vp_technologies: Optional[str] = Field(default=None)  # סמנכ"ל טכנולוגיות
     vp_business_division: Optional[str] = Field(default=None)  # סמנכ"ל חטיבה עסקית
-    vp_approval_date: Optional[str] = Field(default=None)  # תאריך אישור סמנכ"לים
+    vp_approval_date: OptionalDate = Field(default=None)  # תאריך אישור סמנכ"לים
     management_approval: Optional[str] = Field(default=None)  # אישור הנהלה
-    management_approval_date: Optional[str] = Field(default=None)  # תאריך אישור הנהלה
+    management_approval_date: OptionalDate = Field(default=None)  # תאריך אישור הנהלה
     board_approval: Optional[str] = Field(default=None)  # אישור דירקטוריון
-    board_approval_date: Optional[str] = Field(default=None)  # תאריך אישור דירקטוריון
+    board_approval_date: OptionalDate = Field(default=None)  # תאריך אישור דירקטוריון
 
     # Branches / Departments
     branch_cto: Optional[str] = Field(default=None)  # ענף CTO
@@ -57,23 +68,152 @@ class CloudServiceBase(SQLModel):
 
     # Provider Details
     provider_description: Optional[str] = Field(default=None)  # תיאור של ספק פתרון מחשוב הענן המוצע
-    is_significant_outsourcing: Optional[str] = Field(default=None)  # האם הספק מסווג כספק מיקור חוץ מהותי
-    is_significant_cyber: Optional[str] = Field(default=None)  # האם הספק מסווג כספק סייבר מהותי
-    is_bia_relevant: Optional[str] = Field(default=None)  # האם רלוונטי לתהליכי המשכיות עסקית/BIA
+    is_significant_outsourcing: Flag = Field(default=None)  # האם הספק מסווג כספק מיקור חוץ מהותי
+    is_significant_cyber: Flag = Field(default=None)  # האם הספק מסווג כספק סייבר מהותי
+    is_bia_relevant: Flag = Field(default=None)  # האם רלוונטי לתהליכי המשכיות עסקית/BIA
 
 class CloudService(CloudServiceBase, table=True):
+    # (column, id) indexes back the filters and keyset-paginated sorts of GET /services/
+    __table_args__ = tuple(
+        Index(f"ix_cloudservice_{name}_id", name, "id")
+        for name in (
+            "system_name", "organization", "committee_date", "status", "total_score",
+            "approval_path", "requesting_unit", "impact_level", "approval_date",
+            "is_significant_outsourcing", "is_significant_cyber", "is_bia_relevant",
+        )
+    ) + (Index("ix_cloudservice_updated_seq", "updated_seq", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    impact_level: Optional[str] = Field(default=None)  # Minimal / Medium / High, derived from total_score
+    updated_seq: Optional[int] = Field(default=None)  # position in the /services/changes feed, see sync.py
+    updated_at: Optional[datetime] = Field(default=None)
+    deleted_at: Optional[datetime] = Field(default=None)  # tombstone; deleted rows are kept for the feed
 
 class CloudServiceCreate(CloudServiceBase):
     id: Optional[int] = None
 
 class CloudServiceRead(CloudServiceBase):
     id: int
+    impact_level: Optional[str] = None
+    updated_seq: Optional[int] = None
+    updated_at: Optional[datetime] = None
+
+class CloudServiceSummary(SQLModel):
+    # Columns shown in the inventory table
+    id: int
+    system_name: Optional[str] = None
+    organization: Optional[str] = None
+    requesting_unit: Optional[str] = None
+    applicant: Optional[str] = None
+    committee_date: OptionalDate = None
+    status: Optional[str] = None
+    approval_path: Optional[str] = None
+    total_score: Optional[int] = None
+    impact_level: Optional[str] = None
+
+class CloudServiceSearchHit(SQLModel):
+    id: int
+    system_name: Optional[str] = None
+    organization: Optional[str] = None
+    status: Optional[str] = None
+    total_score: Optional[int] = None
+    highlight: Optional[str] = None  # system_name with <mark> around matches
+    snippet: Optional[str] = None  # best matching fragment across indexed fields
+    rank: float
+
+class SimilarService(SQLModel):
+    id: int
+    system_name: Optional[str] = None
+    organization: Optional[str] = None
+    requesting_unit: Optional[str] = None
+    status: Optional[str] = None
+    similarity: float  # estimated Jaccard similarity of the texts, 0-1
+
+class ServiceSignature(SQLModel, table=True):
+    # MinHash signature of a service's name and descriptions (see similarity.py)
+    service_id: int = Field(primary_key=True)
+    signature: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+class ServiceSignatureBucket(SQLModel, table=True):
+    # LSH index: one row per signature band, keyed by the band's hash
+    __table_args__ = (Index("ix_servicesignaturebucket_service_id", "service_id"), {"sqlite_with_rowid": False})
+
+    bucket: int = Field(sa_column=Column(BigInteger, primary_key=True))  # signed 64-bit band hash
+    service_id: int = Field(primary_key=True)
+
+class SchemaMigration(SQLModel, table=True):
+    # Applied schema versions (see migrations.py)
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime  # UTC
+
+class ServiceRollup(SQLModel, table=True):
+    # Incrementally maintained aggregate behind /stats (see stats.py)
+    dimension: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)  # "" for services without a value
+    count: int = 0
+    score_sum: int = 0
+
+class ServiceChange(SQLModel, table=True):
+    # Append-only change log (see history.py). Entries hold only the fields a
+    # write changed; checkpoints also hold the full state after the change.
+    __table_args__ = (
+        Index("ix_servicechange_service_id_version", "service_id", "version", unique=True),
+        Index("ix_servicechange_service_id_changed_at", "service_id", "changed_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)  # cursor of the /history feed
+    service_id: int
+    version: int  # 1, 2, ... per service
+    action: str  # create / update / delete
+    changed_at: datetime  # UTC
+    changed_by: Optional[str] = None
+    changes: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))  # field -> [old, new]
+    snapshot: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    # Values a migration could not convert, as they were stored; not part of the state
+    legacy_values: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+
+class ServiceChangeRead(SQLModel):
+    id: int
+    service_id: int
+    version: int
+    action: str
+    changed_at: datetime
+    changed_by: Optional[str] = None
+    changes: Dict[str, List[Any]]  # field -> [old, new]
+    legacy_values: Optional[Dict[str, Any]] = None
+
+class ServiceChanges(SQLModel):
+    upserts: List[CloudServiceRead] = Field(default_factory=list)
+    deleted: List[int] = Field(default_factory=list)  # ids of services deleted since the token
+    token: str  # pass as `since` on the next call
+    has_more: bool = False
+
+class StatsBucket(SQLModel):
+    value: Optional[str] = None
+    count: int
+    average_score: float
+
+class ServiceStats(SQLModel):
+    count: int = 0
+    average_score: float = 0.0
+    dimensions: Dict[str, List[StatsBucket]] = Field(default_factory=dict)
+
+class BulkRowError(SQLModel):
+    index: int  # position of the row in the request body
+    id: Optional[int] = None
+    error: str
+
+class BulkResult(SQLModel):
+    created: int = 0
+    updated: int = 0
+    ids: List[int] = Field(default_factory=list)
+    errors: List[BulkRowError] = Field(default_factory=list)
 
 class CloudServiceUpdate(SQLModel):
     system_name: Optional[str] = None
     organization: Optional[str] = None
-    committee_date: Optional[str] = None
+    committee_date: OptionalDate = None
     requesting_unit: Optional[str] = None
     requesting_product_manager: Optional[str] = None
     applicant: Optional[str] = None
@@ -86,7 +226,7 @@ class CloudServiceUpdate(SQLModel):
     committee_summary: Optional[str] = None
     committee_notes: Optional[str] = None
     approver: Optional[str] = None
-    approval_date: Optional[str] = None
+    approval_date: OptionalDate = None
     explanation_data_leakage: Optional[str] = None
     score_data_leakage: Optional[int] = None
     explanation_provider_fit: Optional[str] = None
@@ -99,11 +239,11 @@ class CloudServiceUpdate(SQLModel):
     score_exit_strategy: Optional[int] = None
     vp_technologies: Optional[str] = None
     vp_business_division: Optional[str] = None
-    vp_approval_date: Optional[str] = None
+    vp_approval_date: OptionalDate = None
     management_approval: Optional[str] = None
-    management_approval_date: Optional[str] = None
+    management_approval_date: OptionalDate = None
     board_approval: Optional[str] = None
-    board_approval_date: Optional[str] = None
+    board_approval_date: OptionalDate = None
     branch_cto: Optional[str] = None
     branch_infrastructure: Optional[str] = None
     dept_infosec: Optional[str] = None
@@ -111,6 +251,6 @@ class CloudServiceUpdate(SQLModel):
     additional_factors: Optional[str] = None
     other_factors: Optional[str] = None
     provider_description: Optional[str] = None
-    is_significant_outsourcing: Optional[str] = None
-    is_significant_cyber: Optional[str] = None
-    is_bia_relevant: Optional[str] = None
+    is_significant_outsourcing: Flag = None
+    is_significant_cyber: Flag = None
+    is_bia_relevant: Flag = None
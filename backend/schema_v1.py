@@ -0,0 +1,86 @@
+from sqlalchemy import JSON, BigInteger, Boolean, Column, Date, Index, Integer, LargeBinary, MetaData, Table
+from sqlmodel import AutoString, UTCDateTime
+
+# The schema as migration step 1 creates it, written out rather than taken
+# from models.py so the step does the same thing whatever the models look
+# like later. Never edit it: a schema change is a new step in migrations.py.
+metadata = MetaData()
+
+SERVICE_TEXT = [
+    "system_name", "organization", "requesting_unit", "requesting_product_manager", "applicant",
+    "subsidiaries", "solution_description", "approval_path", "status", "committee_summary",
+    "committee_notes", "approver", "explanation_data_leakage", "explanation_provider_fit",
+    "explanation_service_failure", "explanation_compliance", "explanation_exit_strategy",
+    "vp_technologies", "vp_business_division", "management_approval", "board_approval", "branch_cto",
+    "branch_infrastructure", "dept_infosec", "tech_risk_management", "additional_factors",
+    "other_factors", "provider_description", "impact_level",
+]
+SERVICE_INTEGERS = [
+    "cmdb_id", "total_score", "score_data_leakage", "score_provider_fit", "score_service_failure",
+    "score_compliance", "score_exit_strategy", "updated_seq",
+]
+SERVICE_DATES = [
+    "committee_date", "approval_date", "vp_approval_date", "management_approval_date", "board_approval_date",
+]
+SERVICE_FLAGS = ["is_significant_outsourcing", "is_significant_cyber", "is_bia_relevant"]
+SERVICE_INDEXED = [
+    "system_name", "organization", "committee_date", "status", "total_score", "approval_path",
+    "requesting_unit", "impact_level", "approval_date", "is_significant_outsourcing", "is_significant_cyber",
+    "is_bia_relevant",
+]
+
+cloudservice = Table(
+    "cloudservice", metadata,
+    Column("id", Integer, primary_key=True),
+    *[Column(name, AutoString) for name in SERVICE_TEXT],
+    *[Column(name, Integer) for name in SERVICE_INTEGERS],
+    *[Column(name, Date) for name in SERVICE_DATES],
+    *[Column(name, Boolean) for name in SERVICE_FLAGS],
+    Column("updated_at", UTCDateTime),
+    Column("deleted_at", UTCDateTime),
+    *[Index(f"ix_cloudservice_{name}_id", name, "id") for name in SERVICE_INDEXED],
+    Index("ix_cloudservice_updated_seq", "updated_seq", unique=True),
+)
+
+Table(
+    "servicesignature", metadata,
+    Column("service_id", Integer, primary_key=True),
+    Column("signature", LargeBinary, nullable=False),
+)
+
+Table(
+    "servicesignaturebucket", metadata,
+    Column("bucket", BigInteger, primary_key=True),
+    Column("service_id", Integer, primary_key=True),
+    Index("ix_servicesignaturebucket_service_id", "service_id"),
+    sqlite_with_rowid=False,
+)
+
+Table(
+    "schemamigration", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", AutoString, nullable=False),
+    Column("applied_at", UTCDateTime, nullable=False),
+)
+
+Table(
+    "servicerollup", metadata,
+    Column("dimension", AutoString, primary_key=True),
+    Column("value", AutoString, primary_key=True),
+    Column("count", Integer, nullable=False),
+    Column("score_sum", Integer, nullable=False),
+)
+
+Table(
+    "servicechange", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("service_id", Integer, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("action", AutoString, nullable=False),
+    Column("changed_at", UTCDateTime, nullable=False),
+    Column("changed_by", AutoString),
+    Column("changes", JSON, nullable=False),
+    Column("snapshot", JSON),
+    Index("ix_servicechange_service_id_version", "service_id", "version", unique=True),
+    Index("ix_servicechange_service_id_changed_at", "service_id", "changed_at"),
+)
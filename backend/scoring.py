@@ -0,0 +1,96 @@
+from typing import Mapping, Optional
+from sqlalchemy import bindparam, case, func, or_, update
+from sqlmodel import Session, select
+from history import TRACKED_FIELDS, ChangeLog
+from models import CloudService
+from stats import rebuild_rollups
+from sync import LIVE, stamp_rows
+
+# Risk questionnaire: score field -> maximum points
+SCORE_MAXIMUMS = {
+    "score_data_leakage": 30,
+    "score_provider_fit": 15,
+    "score_service_failure": 30,
+    "score_compliance": 15,
+    "score_exit_strategy": 10,
+}
+
+# Impact level by total score, checked from the top (same bands as the UI)
+IMPACT_LEVELS = [
+    ("High", 70),
+    ("Medium", 50),
+    ("Minimal", 0),
+]
+
+BACKFILL_USER = "backfill: scores"
+
+def clamp_score(value: Optional[int], maximum: int) -> int:
+    return min(max(value or 0, 0), maximum)
+
+def impact_level(total_score: int) -> str:
+    for level, minimum in IMPACT_LEVELS:
+        if total_score >= minimum:
+            return level
+    return IMPACT_LEVELS[-1][0]
+
+def compute_scores(values: Mapping) -> dict:
+    # The server owns total_score and impact_level; whatever the client sent
+    # for them is replaced by the clamped sum of the question scores.
+    scores = {name: clamp_score(values.get(name), maximum) for name, maximum in SCORE_MAXIMUMS.items()}
+    total = sum(scores.values())
+    return {**scores, "total_score": total, "impact_level": impact_level(total)}
+
+def apply_scores(service: CloudService) -> None:
+    values = {name: getattr(service, name) for name in SCORE_MAXIMUMS}
+    for name, value in compute_scores(values).items():
+        setattr(service, name, value)
+
+def _clamp_sql(column, maximum: int):
+    value = func.coalesce(column, 0)
+    return case((value > maximum, maximum), (value < 0, 0), else_=value)
+
+def _impact_level_sql(total):
+    return case(*[(total >= minimum, level) for level, minimum in IMPACT_LEVELS[:-1]], else_=IMPACT_LEVELS[-1][0])
+
+def backfill_scores(session: Session) -> int:
+    # Recompute the rows whose stored scores disagree with their answers, e.g.
+    # after upgrading a database whose totals were computed by clients. Each
+    # one is stamped and logged like any other write, so the recomputed
+    # scores reach /services/changes and the service history.
+    clamped = {name: _clamp_sql(getattr(CloudService, name), maximum) for name, maximum in SCORE_MAXIMUMS.items()}
+    total = sum(clamped.values())
+    stale = or_(
+        *[getattr(CloudService, name).is_distinct_from(value) for name, value in clamped.items()],
+        CloudService.total_score.is_distinct_from(total),
+        CloudService.impact_level.is_distinct_from(_impact_level_sql(total)),
+    )
+    columns = [getattr(CloudService, name) for name in TRACKED_FIELDS]
+    rows = session.exec(select(CloudService.id, *columns).where(LIVE, stale).order_by(CloudService.id)).all()
+    log = ChangeLog(BACKFILL_USER)
+    values = []
+    for row in rows:
+        old = dict(zip(TRACKED_FIELDS, row[1:]))
+        scores = compute_scores(old)
+        log.add(row.id, old, {**old, **scores})
+        values.append({"row_id": row.id, **scores})
+    if values:
+        stamp_rows(session, values)
+        stmt = (
+            update(CloudService.__table__)
+            .where(CloudService.__table__.c.id == bindparam("row_id"))
+            .values({name: bindparam(name) for name in values[0] if name != "row_id"})
+        )
+        session.execute(stmt, values)
+    log.write(session)
+    rebuild_rollups(session)
+    session.commit()
+    return len(values)
+
+if __name__ == "__main__":
+    from database import engine
+    from migrations import migrate_database
+
+    migrate_database()
+    with Session(engine) as session:
+        count = backfill_scores(session)
+    print(f"Recomputed scores for {count} services.")
@@ -0,0 +1,141 @@
+from typing import List, Optional
+from sqlalchemy import column, table
+from sqlmodel import Session, select, text
+from models import CloudService
+from sync import LIVE
+
+# Full-text index over the free-text fields of CloudService (SQLite FTS5).
+# It is an external-content table: the text lives only in `cloudservice`,
+# and triggers keep the index in sync on INSERT/UPDATE/DELETE.
+FTS_TABLE = "cloudservice_fts"
+
+# Indexed columns and their bm25 weights (higher = more relevant)
+SEARCH_FIELDS = {
+    "system_name": 10.0,
+    "applicant": 5.0,
+    "solution_description": 2.0,
+    "provider_description": 2.0,
+    "committee_summary": 1.0,
+    "committee_notes": 1.0,
+    "explanation_data_leakage": 1.0,
+    "explanation_provider_fit": 1.0,
+    "explanation_service_failure": 1.0,
+    "explanation_compliance": 1.0,
+    "explanation_exit_strategy": 1.0,
+}
+
+HIT_FIELDS = {"id", "system_name", "organization", "status", "total_score"}
+
+# Substring (trigram) matching, like the LIKE '%x%' search it replaces.
+# This also finds Hebrew words behind attached prefixes (ה/ו/ב/ל/מ/ש).
+MIN_TERM_LENGTH = 3
+
+fts = table(FTS_TABLE, column("rowid"), column("rank"), column(FTS_TABLE))
+
+def _search_index_ddl(base: str) -> List[str]:
+    cols = ", ".join(SEARCH_FIELDS)
+    new_cols = ", ".join(f"new.{c}" for c in SEARCH_FIELDS)
+    old_cols = ", ".join(f"old.{c}" for c in SEARCH_FIELDS)
+    delete_old = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols});"
+    )
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {base} "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {base} "
+        f"BEGIN {delete_old} END",
+        # Only reindex when an indexed column changes (score-only PATCHes skip it)
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {cols} ON {base} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+def create_search_index(connection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+    base = CloudService.__tablename__
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    if not exists:
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, content='{base}', content_rowid='id', "
+            "tokenize='trigram')"
+        )
+        weights = ", ".join(str(w) for w in SEARCH_FIELDS.values())
+        connection.exec_driver_sql(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25({weights})')"
+        )
+        # Index rows that existed before the search table was introduced
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    for statement in _search_index_ddl(base):
+        connection.exec_driver_sql(statement)
+
+def match_expression(search: Optional[str]) -> Optional[str]:
+    # Every word becomes a quoted substring term, so FTS5 syntax in user
+    # input is never interpreted. The trigram tokenizer cannot match terms
+    # shorter than three characters, so those are left out.
+    terms = [
+        t.replace('"', '""') for t in (search or "").split() if len(t) >= MIN_TERM_LENGTH
+    ]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"' for t in terms)
+
+def supports_fts(session: Session) -> bool:
+    return session.get_bind().dialect.name == "sqlite"
+
+def apply_search(query, search: Optional[str], session: Session):
+    search = (search or "").strip()
+    if not search:
+        return query
+    expression = match_expression(search)
+    if expression is None or not supports_fts(session):
+        # One or two typed characters (or no FTS5): substring scan on name/applicant
+        return query.where(
+            (CloudService.system_name.contains(search)) |
+            (CloudService.applicant.contains(search))
+        )
+    return (
+        query.join(fts, fts.c.rowid == CloudService.id)
+        .where(fts.c[FTS_TABLE].op("MATCH")(expression))
+        .order_by(fts.c.rank)
+    )
+
+def search_hits(session: Session, search: str, offset: int = 0, limit: int = 20) -> List[dict]:
+    if not (search or "").strip():
+        return []
+    expression = match_expression(search)
+    if expression is None or not supports_fts(session):
+        query = apply_search(select(CloudService).where(LIVE), search, session).offset(offset).limit(limit)
+        return [
+            {**service.model_dump(include=HIT_FIELDS), "rank": 0.0}
+            for service in session.exec(query).all()
+        ]
+    base = CloudService.__tablename__
+    name_col = list(SEARCH_FIELDS).index("system_name")
+    rows = session.execute(
+        text(
+            f"SELECT s.id, s.system_name, s.organization, s.status, s.total_score, "
+            f"highlight({FTS_TABLE}, {name_col}, '<mark>', '</mark>') AS highlight, "
+            f"snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', 16) AS snippet, "
+            f"{FTS_TABLE}.rank AS rank "
+            f"FROM {FTS_TABLE} JOIN {base} AS s ON s.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :expression AND s.deleted_at IS NULL "
+            f"ORDER BY {FTS_TABLE}.rank LIMIT :limit OFFSET :offset"
+        ).bindparams(expression=expression, limit=limit, offset=offset)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+def rebuild_search_index(session: Session) -> None:
+    session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    session.commit()
+
+if __name__ == "__main__":
+    from database import engine
+
+    with Session(engine) as session:
+        rebuild_search_index(session)
+    print("Search index rebuilt.")
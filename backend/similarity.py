@@ -0,0 +1,176 @@
+import re
+import zlib
+from hashlib import blake2b
+from typing import Iterable, List, Mapping, Optional
+import numpy as np
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from models import CloudService, ServiceSignature, ServiceSignatureBucket
+from sync import LIVE
+
+# Near-duplicate detection. The name and descriptions of every service are
+# reduced to a MinHash signature: for each of NUM_HASHES hash functions, the
+# smallest hash over the text's character shingles. The share of positions
+# where two signatures agree estimates the Jaccard similarity of the texts.
+# Signatures are cut into LSH_BANDS bands, and services that share a band's
+# hash (bucket) are the only candidates compared, so a lookup reads a few
+# index entries instead of every row.
+SIMILARITY_FIELDS = ["system_name", "provider_description", "solution_description"]
+SHINGLE_SIZE = 4  # characters; also matches Hebrew words behind attached prefixes
+NUM_HASHES = 128
+# 4 hashes per band: texts 60% alike share a bucket 99% of the time, 30% alike 23%
+LSH_BANDS = 32
+SIMILAR_THRESHOLD = 0.5
+DUPLICATE_THRESHOLD = 0.8
+INDEX_PAGE_SIZE = 2000
+
+# Fixed seed: signatures stored by one process are compared in another.
+# Changing the hashes or the shingling needs `python similarity.py`.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_random = np.random.RandomState(20240101)
+_A = _random.randint(1, _MERSENNE_PRIME, NUM_HASHES, dtype=np.uint64)
+_B = _random.randint(0, _MERSENNE_PRIME, NUM_HASHES, dtype=np.uint64)
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize_text(values: Mapping) -> str:
+    text = " ".join(values.get(name) or "" for name in SIMILARITY_FIELDS)
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def _shingles(text: str) -> np.ndarray:
+    # CRC32 rather than hash(), which is salted per process
+    pieces = {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+    return np.fromiter((zlib.crc32(p.encode("utf-8")) for p in pieces), dtype=np.uint64, count=len(pieces))
+
+def compute_signature(values: Mapping) -> Optional[np.ndarray]:
+    # None for services without any text to compare
+    text = normalize_text(values)
+    if not text:
+        return None
+    shingles = _shingles(text)
+    # (a * x + b) mod p for every shingle and hash function at once. The
+    # products wrap at 64 bits, which keeps small shingle hashes from
+    # winning every hash function (and is how datasketch's MinHash works).
+    hashed = (shingles[:, None] * _A + _B) % _MERSENNE_PRIME
+    return hashed.min(axis=0).astype(np.uint32)
+
+def bucket_keys(signature: np.ndarray) -> List[int]:
+    keys = []
+    for band, values in enumerate(signature.reshape(LSH_BANDS, -1)):
+        digest = blake2b(values.tobytes(), digest_size=8, salt=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+def remove_signatures(session: Session, service_ids: List[int]) -> None:
+    if not service_ids:
+        return
+    session.execute(delete(ServiceSignatureBucket).where(ServiceSignatureBucket.service_id.in_(service_ids)))
+    session.execute(delete(ServiceSignature).where(ServiceSignature.service_id.in_(service_ids)))
+
+def index_services(session: Session, services: Mapping[int, Mapping]) -> None:
+    # Replaces the signatures of the given services (id -> field values).
+    # Works on a Session or a Connection, in the caller's transaction.
+    remove_signatures(session, list(services))
+    signatures = []
+    buckets = []
+    for service_id, values in services.items():
+        signature = compute_signature(values)
+        if signature is None:
+            continue
+        signatures.append({"service_id": service_id, "signature": signature.tobytes()})
+        buckets.extend({"bucket": key, "service_id": service_id} for key in set(bucket_keys(signature)))
+    if signatures:
+        # Core inserts (no ORM bookkeeping); buckets in key order so the
+        # index pages are written in sequence rather than at random
+        session.execute(ServiceSignature.__table__.insert(), signatures)
+        buckets.sort(key=lambda row: row["bucket"])
+        session.execute(ServiceSignatureBucket.__table__.insert(), buckets)
+
+def text_changed(old: Optional[Mapping], new: Mapping) -> bool:
+    return old is None or any(old.get(name) != new.get(name) for name in SIMILARITY_FIELDS)
+
+def _matches(session: Session, signature: np.ndarray, threshold: float, limit: int, exclude: Optional[int]) -> List[dict]:
+    candidates = select(ServiceSignatureBucket.service_id).where(
+        ServiceSignatureBucket.bucket.in_(bucket_keys(signature))
+    )
+    query = (
+        select(
+            ServiceSignature.signature, CloudService.id, CloudService.system_name, CloudService.organization,
+            CloudService.requesting_unit, CloudService.status,
+        )
+        .join(CloudService, CloudService.id == ServiceSignature.service_id)
+        .where(ServiceSignature.service_id.in_(candidates), LIVE)
+    )
+    if exclude is not None:
+        query = query.where(CloudService.id != exclude)
+    rows = session.execute(query).all()
+    if not rows:
+        return []
+    matrix = np.frombuffer(b"".join(row.signature for row in rows), dtype=np.uint32).reshape(len(rows), NUM_HASHES)
+    scores = (matrix == signature).mean(axis=1)
+    matches = []
+    for i in np.argsort(-scores, kind="stable")[:limit]:
+        if scores[i] < threshold:
+            break
+        matches.append({**_row_fields(rows[i]), "similarity": round(float(scores[i]), 3)})
+    return matches
+
+def _row_fields(row) -> dict:
+    mapping = row._mapping
+    return {key: mapping[key] for key in ("id", "system_name", "organization", "requesting_unit", "status")}
+
+def similar_services(session: Session, service_id: int, threshold: float = SIMILAR_THRESHOLD, limit: int = 10) -> List[dict]:
+    stored = session.get(ServiceSignature, service_id)
+    if stored is None:
+        return []
+    signature = np.frombuffer(stored.signature, dtype=np.uint32)
+    return _matches(session, signature, threshold, limit, exclude=service_id)
+
+def find_duplicates(
+    session: Session, values: Mapping, threshold: float = DUPLICATE_THRESHOLD, limit: int = 5,
+    exclude: Optional[int] = None,
+) -> List[dict]:
+    # Live services whose text is close to `values`, e.g. a service being created
+    signature = compute_signature(values)
+    if signature is None:
+        return []
+    return _matches(session, signature, threshold, limit, exclude)
+
+def _pages(session: Session, query) -> Iterable[dict]:
+    # Keyset pages by id, so large tables are not read into memory at once
+    last_id = 0
+    while True:
+        rows = session.execute(query.where(CloudService.id > last_id).order_by(CloudService.id).limit(INDEX_PAGE_SIZE)).all()
+        if not rows:
+            return
+        yield {row.id: row._mapping for row in rows}
+        last_id = rows[-1].id
+
+def _text_query():
+    return select(CloudService.id, *(getattr(CloudService, name) for name in SIMILARITY_FIELDS)).where(LIVE)
+
+def index_missing_signatures(session: Session, service_ids: Optional[List[int]] = None) -> None:
+    # Services written before signatures existed or by a bulk import, all or
+    # those among service_ids (those without text are read again each time,
+    # and again get none)
+    query = _text_query().where(CloudService.id.not_in(select(ServiceSignature.service_id)))
+    if service_ids is None:
+        for page in _pages(session, query):
+            index_services(session, page)
+        return
+    for start in range(0, len(service_ids), INDEX_PAGE_SIZE):
+        rows = session.execute(query.where(CloudService.id.in_(service_ids[start:start + INDEX_PAGE_SIZE]))).all()
+        index_services(session, {row.id: row._mapping for row in rows})
+
+def rebuild_signatures(session: Session) -> None:
+    session.execute(delete(ServiceSignatureBucket))
+    session.execute(delete(ServiceSignature))
+    for page in _pages(session, _text_query()):
+        index_services(session, page)
+
+if __name__ == "__main__":
+    from database import engine
+
+    with Session(engine) as session:
+        rebuild_signatures(session)
+        session.commit()
+    print("Similarity signatures rebuilt.")
@@ -0,0 +1,85 @@
+import builtins
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cold-start report: how long each module main.py imports takes (including
+# what it pulls in), how long each lifespan phase takes and when the app
+# was ready and served its first request, counted from when main.py started
+# importing. Logged, and exported on /metrics. Only the standard library is
+# imported here, since main.py imports this module first.
+# STARTUP_BUDGET_SECONDS warns when the first request comes later than that.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "0"))  # 0: no budget
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: List[Tuple[str, float]] = []
+        self.phases: Dict[str, float] = {}
+        self.ready: Optional[float] = None
+        self.first_request: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+REPORT = StartupReport()
+
+_original_import = builtins.__import__
+_depth = 0
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Times the import statements of main.py itself (depth 0), each one
+    # including the modules it imports in turn
+    global _depth
+    if _depth or level or name in sys.modules:
+        _depth += 1
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            _depth -= 1
+    started = time.perf_counter()
+    _depth += 1
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+        REPORT.imports.append((name, time.perf_counter() - started))
+
+def imports_done() -> None:
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+    REPORT.phases["imports"] = REPORT.elapsed()
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REPORT.phases[name] = time.perf_counter() - started
+
+def _slowest_imports(count: int = 8) -> str:
+    slowest = sorted(REPORT.imports, key=lambda item: -item[1])[:count]
+    return ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in slowest)
+
+def mark_ready() -> None:
+    REPORT.ready = REPORT.elapsed()
+    phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in REPORT.phases.items())
+    logger.info("Ready %.0fms after import started (%s); slowest imports: %s",
+                REPORT.ready * 1000, phases, _slowest_imports())
+
+def mark_request_served() -> None:
+    if REPORT.first_request is not None:
+        return
+    REPORT.first_request = REPORT.elapsed()
+    logger.info("First request served %.0fms after import started", REPORT.first_request * 1000)
+    if STARTUP_BUDGET_SECONDS and REPORT.first_request > STARTUP_BUDGET_SECONDS:
+        logger.warning("Cold start took %.2fs, over the %.2fs budget (STARTUP_BUDGET_SECONDS)",
+                       REPORT.first_request, STARTUP_BUDGET_SECONDS)
+
+builtins.__import__ = _timed_import
@@ -0,0 +1,168 @@
+import sys
+from datetime import date
+from collections import defaultdict
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+from sqlalchemy import Connection, String, cast, delete, func, literal
+from sqlmodel import Session, select
+from database import dialect_insert
+from models import CloudService, ServiceRollup, ServiceStats, StatsBucket
+from sync import LIVE
+
+# Portfolio rollups: one ServiceRollup row per (dimension, value) holding the
+# number of services and the sum of their total_score. Write paths apply
+# deltas in the same transaction, so /stats never groups the full table.
+ROLLUP_DIMENSIONS = [
+    "organization",
+    "requesting_unit",
+    "status",
+    "approval_path",
+    "impact_level",
+    "committee_month",
+]
+TOTAL = "total"
+
+ROLLUP_FIELDS = [d for d in ROLLUP_DIMENSIONS if d != "committee_month"] + ["committee_date", "total_score"]
+
+def rollup_snapshot(service) -> dict:
+    # The fields rollups depend on, taken before a write changes them
+    return {name: getattr(service, name) for name in ROLLUP_FIELDS}
+
+def _month(committee_date: Optional[date]) -> str:
+    return committee_date.isoformat()[:7] if committee_date else ""
+
+def _rollup_keys(values: Mapping) -> List[Tuple[str, str]]:
+    keys = [(TOTAL, "")]
+    for dimension in ROLLUP_DIMENSIONS:
+        if dimension == "committee_month":
+            keys.append((dimension, _month(values.get("committee_date"))))
+        else:
+            keys.append((dimension, values.get(dimension) or ""))
+    return keys
+
+class RollupDeltas:
+    def __init__(self):
+        self._deltas: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0])
+
+    def add(self, values: Optional[Mapping], sign: int) -> None:
+        if values is None:
+            return
+        score = values.get("total_score") or 0
+        for key in _rollup_keys(values):
+            self._deltas[key][0] += sign
+            self._deltas[key][1] += sign * score
+
+    def change(self, old: Optional[Mapping], new: Optional[Mapping]) -> None:
+        self.add(old, -1)
+        self.add(new, +1)
+
+    def apply(self, session: Session) -> None:
+        rows = [
+            {"dimension": dimension, "value": value, "count": count, "score_sum": score_sum}
+            for (dimension, value), (count, score_sum) in self._deltas.items()
+            if count or score_sum
+        ]
+        self._deltas.clear()
+        if not rows:
+            return
+        insert = dialect_insert(session)
+        stmt = insert(ServiceRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ServiceRollup.dimension, ServiceRollup.value],
+            set_={
+                "count": ServiceRollup.count + stmt.excluded.count,
+                "score_sum": ServiceRollup.score_sum + stmt.excluded.score_sum,
+            },
+        )
+        session.execute(stmt, rows)
+
+def record_change(session: Session, old: Optional[Mapping], new: Optional[Mapping]) -> None:
+    deltas = RollupDeltas()
+    deltas.change(old, new)
+    deltas.apply(session)
+
+def _bucket(row: ServiceRollup) -> StatsBucket:
+    return StatsBucket(
+        value=row.value or None,
+        count=row.count,
+        average_score=round(row.score_sum / row.count, 2) if row.count else 0.0,
+    )
+
+def read_stats(session: Session) -> ServiceStats:
+    rows = session.exec(
+        select(ServiceRollup).where(ServiceRollup.count > 0).order_by(ServiceRollup.dimension, ServiceRollup.value)
+    ).all()
+    stats = ServiceStats(dimensions={dimension: [] for dimension in ROLLUP_DIMENSIONS})
+    for row in rows:
+        if row.dimension == TOTAL:
+            total = _bucket(row)
+            stats.count, stats.average_score = total.count, total.average_score
+        elif row.dimension in stats.dimensions:
+            stats.dimensions[row.dimension].append(_bucket(row))
+    return stats
+
+def _grouped_rollups():
+    # Full recomputation, one GROUP BY per dimension
+    selects = [
+        select(literal(TOTAL), literal(""), func.count(), func.coalesce(func.sum(CloudService.total_score), 0))
+        .where(LIVE)
+    ]
+    for dimension in ROLLUP_DIMENSIONS:
+        if dimension == "committee_month":
+            key = func.coalesce(func.substr(cast(CloudService.committee_date, String), 1, 7), "")
+        else:
+            key = func.coalesce(getattr(CloudService, dimension), "")
+        selects.append(
+            select(literal(dimension), key, func.count(), func.coalesce(func.sum(CloudService.total_score), 0))
+            .where(LIVE)
+            .group_by(key)
+        )
+    return selects
+
+def rebuild_rollups(session: Union[Session, Connection]) -> None:
+    session.execute(delete(ServiceRollup))
+    for query in _grouped_rollups():
+        rows = [
+            {"dimension": dimension, "value": value, "count": count, "score_sum": score_sum}
+            for dimension, value, count, score_sum in session.execute(query).all()
+            if count
+        ]
+        if rows:
+            session.execute(ServiceRollup.__table__.insert(), rows)
+
+def check_rollups(session: Session) -> List[str]:
+    expected = {}
+    for query in _grouped_rollups():
+        for dimension, value, count, score_sum in session.execute(query).all():
+            if count:
+                expected[(dimension, value)] = (count, score_sum)
+    actual = {
+        (row.dimension, row.value): (row.count, row.score_sum)
+        for row in session.exec(select(ServiceRollup)).all()
+        if row.count or row.score_sum
+    }
+    problems = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            problems.append(f"{key[0]}={key[1]!r}: stored {actual.get(key)}, recomputed {expected.get(key)}")
+    return problems
+
+if __name__ == "__main__":
+    from database import engine
+    from migrations import migrate_database
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    migrate_database()
+    with Session(engine) as session:
+        if command == "rebuild":
+            rebuild_rollups(session)
+            session.commit()
+            print("Rollups rebuilt.")
+        elif command == "check":
+            problems = check_rollups(session)
+            for problem in problems:
+                print(problem)
+            print("Rollups are consistent." if not problems else f"{len(problems)} rollups differ.")
+            sys.exit(1 if problems else 0)
+        else:
+            print("Usage: python stats.py [check|rebuild]")
+            sys.exit(2)
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import Connection, func, update
+from sqlmodel import Session, select
+from models import CloudService, CloudServiceRead, ServiceChanges
+
+# Every write stamps the row with the next updated_seq, a counter over the
+# whole table. Writes are serialized on the single writer connection, so
+# sequence order is commit order and "rows with updated_seq > token" is
+# exactly what a client has not seen yet. Deletes keep the row as a
+# tombstone (deleted_at set) so the feed can report them.
+SYNC_FIELDS = ["updated_seq", "updated_at", "deleted_at"]
+
+LIVE = CloudService.deleted_at.is_(None)
+
+def next_seq(session: Session) -> int:
+    current = session.exec(select(func.max(CloudService.updated_seq))).one()
+    return (current or 0) + 1
+
+def stamp(session: Session, service: CloudService) -> None:
+    service.updated_seq = next_seq(session)
+    service.updated_at = datetime.now(timezone.utc)
+
+def stamp_rows(session: Session, values: List[dict]) -> None:
+    # Consecutive sequence numbers for a batch written in one transaction
+    start = next_seq(session)
+    now = datetime.now(timezone.utc)
+    for offset, value in enumerate(values):
+        value.update(updated_seq=start + offset, updated_at=now, deleted_at=None)
+
+def soft_delete(session: Session, service: CloudService) -> None:
+    stamp(session, service)
+    service.deleted_at = service.updated_at
+
+def live_service(session: Session, service_id: int) -> Optional[CloudService]:
+    service = session.get(CloudService, service_id)
+    if service is None or service.deleted_at is not None:
+        return None
+    return service
+
+def parse_token(token: Optional[str]) -> int:
+    if not token:
+        return 0
+    try:
+        seq = int(token)
+    except ValueError:
+        seq = -1
+    if seq < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return seq
+
+def read_changes(session: Session, since: int, limit: int) -> ServiceChanges:
+    query = select(CloudService).where(CloudService.updated_seq > since)
+    if since == 0:
+        # A first sync has nothing to remove
+        query = query.where(LIVE)
+    rows = session.exec(query.order_by(CloudService.updated_seq).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = ServiceChanges(token=str(rows[-1].updated_seq if rows else since), has_more=has_more)
+    for row in rows:
+        if row.deleted_at is None:
+            changes.upserts.append(CloudServiceRead.model_validate(row))
+        else:
+            changes.deleted.append(row.id)
+    return changes
+
+def number_existing_rows(connection: Connection) -> None:
+    # Rows written before updated_seq existed join the feed in id order
+    current = connection.execute(select(func.max(CloudService.updated_seq))).scalar() or 0
+    connection.execute(
+        update(CloudService).where(CloudService.updated_seq.is_(None)).values(updated_seq=CloudService.id + current)
+    )
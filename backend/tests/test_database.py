@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+from database import create_engines, database_settings
+from migrations import migrate
+from models import CloudService
+
+@pytest.fixture(name="engines")
+def engines_fixture(tmp_path):
+    writer, reader = create_engines(str(tmp_path / "test.db"))
+    with writer.begin() as connection:
+        migrate(connection)
+    yield writer, reader
+    writer.dispose()
+    reader.dispose()
+
+def test_migrations_build_the_model_schema(engines):
+    # Step 1 is frozen, so every model change since needs a step of its own
+    from sqlalchemy import inspect
+    from sqlmodel import SQLModel
+
+    writer, _ = engines
+    inspector = inspect(writer)
+    for table in SQLModel.metadata.sorted_tables:
+        assert {c["name"] for c in inspector.get_columns(table.name)} == set(table.columns.keys()), table.name
+        assert {i["name"] for i in inspector.get_indexes(table.name)} >= {i.name for i in table.indexes}, table.name
+
+def test_engine_settings(engines):
+    writer, reader = engines
+    writer_settings = database_settings(writer)
+    assert writer_settings["journal_mode"] == "wal"
+    assert writer_settings["synchronous"] == 1  # NORMAL
+    assert writer_settings["busy_timeout"] == 5000
+    assert writer_settings["query_only"] == 0
+
+    reader_settings = database_settings(reader)
+    assert reader_settings["journal_mode"] == "wal"
+    assert reader_settings["query_only"] == 1
+    with Session(reader) as session:
+        session.add(CloudService(system_name="Not allowed"))
+        with pytest.raises(OperationalError):
+            session.commit()
+
+def test_reads_continue_during_writes(engines):
+    # Stress test: readers keep querying while writer threads insert
+    writer, reader = engines
+    writes_per_thread = 100
+    errors = []
+    reads = [0]
+    done = threading.Event()
+
+    def write():
+        try:
+            for i in range(writes_per_thread):
+                with Session(writer) as session:
+                    session.add(CloudService(system_name=f"Service {i}", solution_description="תיאור " * 20))
+                    session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not done.is_set():
+                with Session(reader) as session:
+                    session.exec(select(func.count()).select_from(CloudService)).one()
+                    session.exec(select(CloudService).order_by(CloudService.id.desc()).limit(20)).all()
+                reads[0] += 1
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write) for _ in range(3)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    start = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    with Session(reader) as session:
+        assert session.exec(select(func.count()).select_from(CloudService)).one() == 3 * writes_per_thread
+    assert reads[0] > 0
+    print(f"\n{3 * writes_per_thread} writes, {reads[0]} reads in {elapsed:.2f}s "
+          f"({reads[0] / elapsed:.0f} reads/s during writes)")
@@ -0,0 +1,61 @@
+import datetime
+import pandas as pd
+from import_excel import iso_date_or_none, map_columns, parse_date, parse_date_column, to_records
+
+def test_parse_date_column_matches_parse_date():
+    values = [
+        datetime.datetime(2025, 3, 4, 10, 30),
+        "05/06/2024",
+        "2024-12-31",
+        "2025-01-02",
+        "בבדיקה",
+        None,
+        float("nan"),
+        "",
+    ]
+    parsed = parse_date_column(pd.Series(values, dtype=object))
+    assert list(parsed) == [parse_date(v) for v in values]
+    assert list(parsed) == [
+        "2025-03-04", "2024-06-05", "2024-12-31", "2025-01-02", "בבדיקה", None, None, None
+    ]
+
+def test_typed_column_migration_reads_dates_like_the_importer():
+    # The migration parses without pandas; it must agree with parse_date
+    from typed_columns import normalize_date
+
+    values = [
+        "2025-01-02", "2025-1-2", "2025-01-02 10:00:00", "2025-01-02T10:00:00Z", "05/06/2024", "5/6/24",
+        "05.06.2024", "05-06-2024", "13/01/2024", "01/13/2024", "05/06/2024 10:30", "2024/01/02", "20250102",
+        "Jan 5 2024", "5 January 2024", "January 5, 2024", "31/02/2024", "בבדיקה",
+    ]
+    for value in values:
+        parsed = parse_date(value)
+        expected = datetime.date.fromisoformat(parsed) if iso_date_or_none(parsed) else None
+        assert normalize_date(value) == expected, value
+
+def test_map_columns_cleans_and_types_values():
+    df = pd.DataFrame({
+        "#": [7, None],
+        "שם מערכת / פרויקט": ["  CRM  ", None],
+        "ציון כולל": [55, None],
+        "מספר קטלוגי ב-CMDB": [None, "123"],
+        "מועד הועדה": ["01/02/2025", None],
+        "האם הספק מסווג כספק סייבר מהותי ": ["כן", "  "],
+    })
+    records = to_records(map_columns(df))
+
+    assert records[0]["id"] == 7
+    assert records[0]["system_name"] == "CRM"
+    assert records[0]["total_score"] == 55
+    assert records[0]["cmdb_id"] is None
+    assert records[0]["committee_date"] == "2025-02-01"
+    assert records[0]["is_significant_cyber"] is True
+    assert records[0]["score_exit_strategy"] == 0
+
+    assert records[1]["id"] is None
+    assert records[1]["system_name"] is None
+    assert records[1]["total_score"] == 0
+    assert records[1]["cmdb_id"] == 123
+    assert records[1]["is_significant_cyber"] is None
+    # Plain Python values, ready for json.dumps
+    assert type(records[0]["id"]) is int
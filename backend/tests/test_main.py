@@ -1,28 +1,64 @@
+import importlib.util
+import inspect
+import json
+from datetime import date
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, create_engine, select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
 import pytest
-from main import app, get_session
+from main import create_app, router
+from async_routes import async_router
+from database import get_async_read_session, get_async_session, get_read_session, get_session
+from migrations import migrate
 from models import CloudService
+from scoring import backfill_scores
+from stats import check_rollups, rebuild_rollups
+from history import service_history
+from sync import read_changes
+
+@pytest.fixture(name="db_path")
+def db_path_fixture(tmp_path):
+    return tmp_path / "test.db"
 
 @pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
-    SQLModel.metadata.create_all(engine)
+def session_fixture(db_path):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        migrate(connection)
     with Session(engine) as session:
         yield session
+    engine.dispose()
 
-@pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
+# Every API test runs against the sync handlers and the async (aiosqlite) ones
+@pytest.fixture(name="client", params=["sync", "async"])
+def client_fixture(request, session: Session, db_path):
+    app = create_app(async_mode=request.param == "async")
+    if request.param == "sync":
+        def get_session_override():
+            return session
 
-    app.dependency_overrides[get_session] = get_session_override
-    client = TestClient(app)
-    yield client
-    app.dependency_overrides.clear()
+        app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_read_session] = get_session_override
+        yield TestClient(app)
+        return
+
+    # TestClient runs each request in a fresh event loop, so no pooling
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_async_read_session] = get_async_session_override
+    yield TestClient(app)
+
+def test_async_mode_uses_async_handlers():
+    endpoints = {route.name: route.endpoint for route in async_router(router).routes}
+    assert inspect.iscoroutinefunction(endpoints["read_services"])
+    assert inspect.iscoroutinefunction(endpoints["update_service"])
 
 def test_create_service(client: TestClient):
     response = client.post(
@@ -30,7 +66,7 @@ def test_create_service(client: TestClient):
         json={
             "system_name": "Test Project",
             "applicant": "Alice",
-            "total_score": 10
+            "score_data_leakage": 10
         },
     )
     assert response.status_code == 200
@@ -38,6 +74,7 @@ def test_create_service(client: TestClient):
     assert data["system_name"] == "Test Project"
     assert data["applicant"] == "Alice"
     assert data["total_score"] == 10
+    assert data["impact_level"] == "Minimal"
     assert "id" in data
 
 def test_read_services(client: TestClient):
@@ -60,19 +97,21 @@ def test_update_service(client: TestClient):
     # Create
     create_resp = client.post(
         "/services/",
-        json={"system_name": "Old Name", "total_score": 20}
+        json={"system_name": "Old Name", "score_service_failure": 20}
     )
     service_id = create_resp.json()["id"]
     
     # Update
     response = client.patch(
         f"/services/{service_id}",
-        json={"system_name": "New Name", "total_score": 80}
+        json={"system_name": "New Name", "score_data_leakage": 30, "score_compliance": 15, "score_exit_strategy": 15}
     )
     assert response.status_code == 200
     data = response.json()
     assert data["system_name"] == "New Name"
-    assert data["total_score"] == 80
+    assert data["score_exit_strategy"] == 10
+    assert data["total_score"] == 75
+    assert data["impact_level"] == "High"
 
 def test_delete_service(client: TestClient):
     create_resp = client.post(
@@ -86,3 +125,832 @@ def test_delete_service(client: TestClient):
     
     get_resp = client.get(f"/services/{service_id}")
     assert get_resp.status_code == 404
+
+def test_search_free_text_fields(client: TestClient):
+    client.post(
+        "/services/",
+        json={"system_name": "CRM", "solution_description": "מערכת ניהול לקוחות בענן"}
+    )
+    client.post(
+        "/services/",
+        json={"system_name": "Storage", "provider_description": "ספק אחסון ענן ציבורי"}
+    )
+    client.post("/services/", json={"system_name": "Other", "applicant": "Dana"})
+
+    response = client.get("/services/", params={"search": "ענן"})
+    assert response.status_code == 200
+    names = {s["system_name"] for s in response.json()}
+    assert names == {"CRM", "Storage"}
+
+    # Partial words match while typing, and the old name/applicant search still works
+    assert [s["system_name"] for s in client.get("/services/?search=Sto").json()] == ["Storage"]
+    assert [s["system_name"] for s in client.get("/services/?search=Dan").json()] == ["Other"]
+
+def test_search_ranks_name_matches_first(client: TestClient):
+    client.post("/services/", json={"system_name": "Backup", "committee_notes": "Salesforce"})
+    client.post("/services/", json={"system_name": "Salesforce"})
+
+    data = client.get("/services/", params={"search": "salesforce"}).json()
+    assert [s["system_name"] for s in data] == ["Salesforce", "Backup"]
+
+    # An explicit sort overrides relevance
+    data = client.get("/services/", params={"search": "salesforce", "sort": "id"}).json()
+    assert [s["system_name"] for s in data] == ["Backup", "Salesforce"]
+
+def test_search_index_follows_updates_and_deletes(client: TestClient):
+    service_id = client.post(
+        "/services/", json={"system_name": "Mail", "committee_summary": "approved"}
+    ).json()["id"]
+
+    client.patch(f"/services/{service_id}", json={"committee_summary": "rejected"})
+    assert client.get("/services/?search=approved").json() == []
+    assert len(client.get("/services/?search=rejected").json()) == 1
+
+    client.delete(f"/services/{service_id}")
+    assert client.get("/services/?search=rejected").json() == []
+
+def test_search_hits_are_highlighted(client: TestClient):
+    client.post(
+        "/services/",
+        json={"system_name": "Jira Cloud", "solution_description": "Issue tracking in the cloud"}
+    )
+
+    response = client.get("/services/search", params={"q": "cloud"})
+    assert response.status_code == 200
+    [hit] = response.json()
+    assert hit["system_name"] == "Jira Cloud"
+    assert hit["highlight"] == "Jira <mark>Cloud</mark>"
+    assert "<mark>" in hit["snippet"]
+    assert client.get("/services/search", params={"q": "cloud", "limit": -1}).status_code == 422
+
+def test_search_input_is_not_parsed_as_fts_syntax(client: TestClient):
+    client.post("/services/", json={"system_name": "AND OR NOT"})
+    response = client.get("/services/", params={"search": '"AND (OR* NEAR'})
+    assert response.status_code == 200
+
+def test_search_short_input_falls_back_to_name_scan(client: TestClient):
+    client.post("/services/", json={"system_name": "Zoom", "committee_notes": "zo"})
+    client.post("/services/", json={"system_name": "Teams"})
+
+    data = client.get("/services/", params={"search": "Zo"}).json()
+    assert [s["system_name"] for s in data] == ["Zoom"]
+
+def test_bulk_upsert_json_array(client: TestClient):
+    existing_id = client.post("/services/", json={"system_name": "Old"}).json()["id"]
+
+    response = client.post(
+        "/services/bulk",
+        json=[
+            {"system_name": "New 1"},
+            {"id": existing_id, "system_name": "Replaced", "score_data_leakage": 40},
+            {"system_name": "Bad", "total_score": "not a number"},
+            {"id": 500, "system_name": "Explicit id"},
+        ],
+        params={"batch_size": 2},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["updated"] == 1
+    assert len(data["ids"]) == 3 and 500 in data["ids"]
+    assert [e["index"] for e in data["errors"]] == [2]
+    assert "total_score" in data["errors"][0]["error"]
+
+    replaced = client.get(f"/services/{existing_id}").json()
+    assert replaced["system_name"] == "Replaced"
+    assert replaced["total_score"] == 30
+    assert client.get("/services/500").json()["system_name"] == "Explicit id"
+
+def test_bulk_counts_repeated_ids_per_row(client: TestClient):
+    existing_id = client.post("/services/", json={"system_name": "Old"}).json()["id"]
+
+    data = client.post("/services/bulk", json=[{"id": 10, "system_name": "A"}, {"id": 10, "system_name": "B"}]).json()
+    assert (data["created"], data["updated"]) == (1, 1)
+    data = client.post(
+        "/services/bulk", json=[{"id": existing_id, "system_name": "C"}, {"id": existing_id, "system_name": "D"}]
+    ).json()
+    assert (data["created"], data["updated"]) == (0, 2)
+    assert client.get("/services/10").json()["system_name"] == "B"
+    assert client.get(f"/services/{existing_id}").json()["system_name"] == "D"
+
+def test_bulk_upsert_ndjson_stream(client: TestClient):
+    body = "\n".join([
+        '{"system_name": "Line 1", "solution_description": "ניהול מסמכים"}',
+        '{not json',
+        '{"system_name": "Line 3"}',
+    ])
+    response = client.post(
+        "/services/bulk",
+        content=body.encode(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert [e["index"] for e in data["errors"]] == [1]
+
+    # Bulk rows are searchable like any other insert
+    assert [s["system_name"] for s in client.get("/services/?search=מסמכים").json()] == ["Line 1"]
+
+def test_bulk_rejects_non_array_body(client: TestClient):
+    response = client.post("/services/bulk", json={"system_name": "Not a list"})
+    assert response.status_code == 400
+
+def test_list_filters_and_total_count(client: TestClient):
+    high = {"score_data_leakage": 30, "score_service_failure": 30, "score_compliance": 15}
+    medium = {"score_data_leakage": 30, "score_service_failure": 25}
+    client.post("/services/", json={"system_name": "A", "status": "approved", "organization": "Bank", **high})
+    client.post("/services/", json={"system_name": "B", "status": "approved", "organization": "Insurance", **medium})
+    client.post("/services/", json={"system_name": "C", "status": "pending", "organization": "Bank", "score_exit_strategy": 10})
+
+    response = client.get("/services/", params={"status": "approved", "include_total": True})
+    assert [s["system_name"] for s in response.json()] == ["A", "B"]
+    assert response.headers["X-Total-Count"] == "2"
+
+    data = client.get("/services/", params=[("organization", "Bank"), ("organization", "Insurance"), ("impact", "High")]).json()
+    assert [s["system_name"] for s in data] == ["A"]
+
+    data = client.get("/services/", params={"min_score": 50, "max_score": 60}).json()
+    assert [s["system_name"] for s in data] == ["B"]
+
+    assert client.get("/services/", params={"impact": "Huge"}).status_code == 400
+
+def test_keyset_pagination_follows_sort(client: TestClient):
+    for name, committee_date in [
+        ("a", "2025-03-01"), ("b", None), ("c", "2025-01-01"), ("d", "2025-03-01"), ("e", "2025-02-01"),
+    ]:
+        client.post("/services/", json={"system_name": name, "committee_date": committee_date})
+
+    # NULL sort keys ("b") page correctly too
+    for sort, expected in [
+        ("committee_date", ["b", "c", "e", "a", "d"]),
+        ("-committee_date", ["d", "a", "e", "c", "b"]),
+    ]:
+        names = []
+        cursor = None
+        while True:
+            params = {"sort": sort, "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/services/", params=params)
+            assert response.status_code == 200
+            names += [s["system_name"] for s in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert names == expected
+
+def test_list_rejects_bad_sort_and_cursor(client: TestClient):
+    assert client.get("/services/", params={"sort": "applicant"}).status_code == 400
+    assert client.get("/services/", params={"sort": "id", "cursor": "garbage"}).status_code == 400
+
+    client.post("/services/", json={"system_name": "x"})
+    cursor = client.get("/services/", params={"sort": "id", "limit": 1}).headers["X-Next-Cursor"]
+    assert client.get("/services/", params={"sort": "-id", "cursor": cursor}).status_code == 400
+
+def test_list_field_projection(client: TestClient):
+    client.post(
+        "/services/",
+        json={"system_name": "Slack", "status": "approved", "solution_description": "long text " * 50}
+    )
+    client.post("/services/", json={"system_name": "Zoom", "status": "approved"})
+
+    response = client.get("/services/", params={"fields": "system_name,status", "sort": "system_name", "limit": 1})
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "system_name": "Slack", "status": "approved"}]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/services/", params={"fields": "system_name", "sort": "system_name", "cursor": cursor})
+    assert response.json() == [{"id": 2, "system_name": "Zoom"}]
+
+    summary = client.get("/services/", params={"fields": "summary"}).json()[0]
+    assert "solution_description" not in summary
+    assert set(summary) == {
+        "id", "system_name", "organization", "requesting_unit", "applicant",
+        "committee_date", "status", "approval_path", "total_score", "impact_level",
+    }
+
+    assert client.get("/services/", params={"fields": "system_name,password"}).status_code == 400
+
+def test_projected_dates_match_the_full_response(client: TestClient):
+    client.post("/services/", json={"system_name": "Slack", "committee_date": "2025-03-04"})
+
+    full = client.get("/services/").json()[0]
+    projected = client.get("/services/", params={"fields": "updated_at,committee_date"}).json()[0]
+    assert projected == {"id": full["id"], "updated_at": full["updated_at"], "committee_date": "2025-03-04"}
+
+def test_scores_are_computed_by_the_server(client: TestClient):
+    response = client.post(
+        "/services/",
+        json={"system_name": "Clamped", "score_data_leakage": 99, "score_provider_fit": -5, "total_score": 1},
+    )
+    data = response.json()
+    assert data["score_data_leakage"] == 30
+    assert data["score_provider_fit"] == 0
+    assert data["total_score"] == 30
+    assert data["impact_level"] == "Minimal"
+
+    # A PATCH cannot leave a stale total behind
+    data = client.patch(f"/services/{data['id']}", json={"total_score": 100, "score_service_failure": 30}).json()
+    assert data["total_score"] == 60
+    assert data["impact_level"] == "Medium"
+
+    data = client.post("/services/bulk", json=[{"system_name": "Bulk", "score_compliance": 50}]).json()
+    bulk = client.get(f"/services/{data['ids'][0]}").json()
+    assert bulk["total_score"] == 15
+    assert bulk["impact_level"] == "Minimal"
+
+def test_backfill_scores(session: Session):
+    session.add(CloudService(system_name="Legacy", score_data_leakage=40, score_service_failure=30, total_score=5))
+    session.add(CloudService(system_name="Empty", score_compliance=None))
+    session.commit()
+
+    assert backfill_scores(session) == 2
+
+    legacy, empty = session.exec(select(CloudService).order_by(CloudService.id)).all()
+    assert (legacy.score_data_leakage, legacy.total_score, legacy.impact_level) == (30, 60, "Medium")
+    assert (empty.score_compliance, empty.total_score, empty.impact_level) == (0, 0, "Minimal")
+    # Recomputed rows are new writes for the changes feed and the history
+    assert legacy.updated_seq is not None and empty.updated_seq == legacy.updated_seq + 1
+    assert read_changes(session, 0, 10).token == str(empty.updated_seq)
+    [entry] = service_history(session, legacy.id)
+    assert entry.changed_by == "backfill: scores"
+    assert entry.changes["total_score"] == [5, 60]
+    assert backfill_scores(session) == 0
+
+def test_stats_follow_writes(client: TestClient, session: Session):
+    a = client.post("/services/", json={"system_name": "A", "organization": "Bank", "status": "approved",
+                                        "committee_date": "2025-03-10", "score_data_leakage": 30,
+                                        "score_service_failure": 30, "score_compliance": 15}).json()
+    client.post("/services/", json={"system_name": "B", "organization": "Bank", "score_data_leakage": 20})
+    c = client.post("/services/", json={"system_name": "C", "organization": "Insurance",
+                                        "committee_date": "2025-03-01"}).json()
+    client.patch(f"/services/{a['id']}", json={"status": "rejected", "score_compliance": 5})
+    client.delete(f"/services/{c['id']}")
+    client.post("/services/bulk", json=[{"id": a["id"], "system_name": "A", "organization": "Bank",
+                                         "status": "approved", "committee_date": "2025-03-10",
+                                         "score_data_leakage": 10},
+                                        {"system_name": "D", "organization": "Insurance"}])
+
+    stats = client.get("/stats").json()
+    assert stats["count"] == 3
+    assert stats["average_score"] == 10.0
+    assert stats["dimensions"]["organization"] == [
+        {"value": "Bank", "count": 2, "average_score": 15.0},
+        {"value": "Insurance", "count": 1, "average_score": 0.0},
+    ]
+    assert stats["dimensions"]["status"] == [
+        {"value": None, "count": 2, "average_score": 10.0},
+        {"value": "approved", "count": 1, "average_score": 10.0},
+    ]
+    assert stats["dimensions"]["impact_level"] == [{"value": "Minimal", "count": 3, "average_score": 10.0}]
+    assert stats["dimensions"]["committee_month"] == [
+        {"value": None, "count": 2, "average_score": 10.0},
+        {"value": "2025-03", "count": 1, "average_score": 10.0},
+    ]
+    assert check_rollups(session) == []
+
+def test_rollup_check_and_rebuild(session: Session):
+    # Rows written behind the API's back
+    session.add(CloudService(system_name="Raw", organization="Bank", total_score=40, impact_level="Minimal"))
+    session.commit()
+    assert check_rollups(session)
+
+    rebuild_rollups(session)
+    session.commit()
+    assert check_rollups(session) == []
+
+def test_conditional_get_returns_304(client: TestClient):
+    client.post("/services/", json={"system_name": "Cached"})
+    first = client.get("/services/", params={"sort": "system_name"})
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    cached = client.get("/services/", params={"sort": "system_name"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+def test_writes_invalidate_cached_responses(client: TestClient):
+    created = client.post("/services/", json={"system_name": "Before"}).json()
+    first = client.get("/services/")
+    assert first.json()[0]["system_name"] == "Before"
+    detail = client.get(f"/services/{created['id']}")
+
+    client.patch(f"/services/{created['id']}", json={"system_name": "After"})
+    response = client.get("/services/", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()[0]["system_name"] == "After"
+    assert response.headers["etag"] != first.headers["etag"]
+    assert client.get(f"/services/{created['id']}").json()["system_name"] == "After"
+    assert detail.json()["system_name"] == "Before"
+
+    client.post("/services/bulk", json=[{"system_name": "Bulk"}])
+    assert len(client.get("/services/").json()) == 2
+    client.delete(f"/services/{created['id']}")
+    assert [s["system_name"] for s in client.get("/services/").json()] == ["Bulk"]
+    assert client.get(f"/services/{created['id']}").status_code == 404
+
+def test_cache_is_bounded_lru(monkeypatch):
+    import cache
+    from cache import ResponseCacheMiddleware
+
+    monkeypatch.setattr(cache, "CACHE_ENABLED", "1")
+
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["query_string"])
+        body = scope["query_string"]
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    cache_app = TestClient(ResponseCacheMiddleware(app, max_entries=2))
+    for query in ["a=1", "b=1", "a=1", "c=1", "a=1", "b=1"]:
+        assert cache_app.get(f"/services/?{query}").text == query
+    # b=1 was evicted as least recently used when c=1 was stored
+    assert calls == [b"a=1", b"b=1", b"c=1", b"b=1"]
+
+def test_cache_is_opt_in_without_a_sqlite_file(monkeypatch):
+    import cache
+    from cache import ResponseCacheMiddleware
+
+    monkeypatch.setattr(cache, "CACHE_ENABLED", None)
+    assert ResponseCacheMiddleware(None, database_path="shared.db").enabled
+    # Other workers' writes could not be seen
+    assert not ResponseCacheMiddleware(None).enabled
+    monkeypatch.setattr(cache, "CACHE_ENABLED", "1")
+    assert ResponseCacheMiddleware(None).enabled
+    monkeypatch.setattr(cache, "CACHE_ENABLED", "0")
+    assert not ResponseCacheMiddleware(None, database_path="shared.db").enabled
+
+def test_cache_sees_writes_by_other_processes(tmp_path):
+    import sqlite3
+    from cache import ResponseCacheMiddleware
+
+    path = str(tmp_path / "shared.db")
+    writer = sqlite3.connect(path)
+    writer.execute("PRAGMA journal_mode = WAL")
+    writer.execute("CREATE TABLE item (name TEXT)")
+    writer.commit()
+
+    async def app(scope, receive, send):
+        with sqlite3.connect(path) as connection:
+            body = ",".join(name for (name,) in connection.execute("SELECT name FROM item")).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    cache_app = TestClient(ResponseCacheMiddleware(app, database_path=path))
+    assert cache_app.get("/services/").text == ""
+    # A commit on another connection, as another worker would make, without bump_version
+    writer.execute("INSERT INTO item VALUES ('a')")
+    writer.commit()
+    assert cache_app.get("/services/").text == "a"
+    writer.close()
+
+def test_export_formats_round_trip_through_importer(client: TestClient, tmp_path, monkeypatch):
+    import export
+    from import_excel import map_columns, read_report, to_records
+
+    monkeypatch.setattr(export, "EXPORT_PAGE_SIZE", 2)
+    rows = [
+        {"system_name": f"מערכת {i}", "organization": "Bank" if i % 2 else "Insurance",
+         "committee_date": "2025-03-04", "score_data_leakage": 20, "is_bia_relevant": "כן"}
+        for i in range(5)
+    ]
+    rows[0]["committee_date"] = None
+    rows[0]["is_bia_relevant"] = "לא"
+    client.post("/services/bulk", json=rows)
+
+    ndjson = client.get("/services/export", params={"format": "ndjson"})
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [line["system_name"] for line in lines] == [row["system_name"] for row in rows]
+
+    for export_format in ("csv", "xlsx"):
+        response = client.get("/services/export", params={"format": export_format})
+        assert response.status_code == 200
+        assert "attachment" in response.headers["content-disposition"]
+        path = tmp_path / f"export.{export_format}"
+        path.write_bytes(response.content)
+        records = to_records(map_columns(read_report(str(path))))
+        assert [r["system_name"] for r in records] == [row["system_name"] for row in rows]
+        assert records[0]["committee_date"] is None
+        assert records[0]["is_bia_relevant"] is False
+        assert records[1]["committee_date"] == "2025-03-04"
+        assert records[1]["score_data_leakage"] == 20
+        assert records[1]["is_bia_relevant"] is True
+        assert records[1]["id"] == lines[1]["id"]
+
+def test_export_applies_list_filters(client: TestClient):
+    client.post("/services/bulk", json=[
+        {"system_name": "CRM", "status": "Approved"},
+        {"system_name": "ERP", "status": "Rejected"},
+        {"system_name": "CRM Mobile", "status": "Rejected"},
+    ])
+    response = client.get("/services/export", params={"format": "ndjson", "status": "Rejected", "search": "CRM"})
+    assert [json.loads(line)["system_name"] for line in response.text.splitlines()] == ["CRM Mobile"]
+    assert client.get("/services/export", params={"format": "pdf"}).status_code == 422
+
+def test_history_records_field_deltas(client: TestClient):
+    user = {"X-User": "dana"}
+    created = client.post("/services/", json={"system_name": "CRM", "status": "Pending"}, headers=user).json()
+    service_id = created["id"]
+    client.patch(f"/services/{service_id}", json={"status": "Approved"}, headers=user)
+    client.patch(f"/services/{service_id}", json={"score_data_leakage": 30})
+    client.delete(f"/services/{service_id}", headers=user)
+
+    history = client.get(f"/services/{service_id}/history").json()
+    assert [h["action"] for h in history] == ["create", "update", "update", "delete"]
+    assert [h["version"] for h in history] == [1, 2, 3, 4]
+    assert [h["changed_by"] for h in history] == ["dana", "dana", None, "dana"]
+    assert history[0]["changes"]["system_name"] == [None, "CRM"]
+    assert history[1]["changes"] == {"status": ["Pending", "Approved"]}
+    assert history[2]["changes"] == {"score_data_leakage": [0, 30], "total_score": [0, 30]}
+    assert history[3]["changes"]["status"] == ["Approved", None]
+
+    def as_of(at):
+        return client.get(f"/services/{service_id}/as-of", params={"at": at})
+
+    assert as_of("2000-01-01T00:00:00").status_code == 404
+    assert as_of(history[0]["changed_at"]).json()["status"] == "Pending"
+    assert as_of(history[1]["changed_at"]).json()["status"] == "Approved"
+    assert as_of(history[2]["changed_at"]).json()["total_score"] == 30
+    assert as_of(history[3]["changed_at"]).status_code == 404
+
+def test_as_of_replays_from_nearest_checkpoint(client: TestClient, monkeypatch):
+    import history
+
+    monkeypatch.setattr(history, "CHECKPOINT_INTERVAL", 3)
+    service_id = client.post("/services/", json={"system_name": "v0"}).json()["id"]
+    for i in range(1, 8):
+        client.patch(f"/services/{service_id}", json={"system_name": f"v{i}", "committee_notes": f"note {i}"})
+    entries = client.get(f"/services/{service_id}/history").json()
+    assert len(entries) == 8
+    for i, entry in enumerate(entries):
+        state = client.get(f"/services/{service_id}/as-of", params={"at": entry["changed_at"]}).json()
+        assert state["system_name"] == f"v{i}"
+        assert state["committee_notes"] == (f"note {i}" if i else None)
+
+def test_as_of_before_first_change_of_existing_row(client: TestClient, session: Session):
+    service = CloudService(system_name="Legacy", status="Approved")
+    session.add(service)
+    session.commit()
+    client.patch(f"/services/{service.id}", json={"status": "Retired"})
+    before = client.get(f"/services/{service.id}/as-of", params={"at": "2000-01-01T00:00:00Z"})
+    assert before.json()["status"] == "Approved"
+    assert before.json()["system_name"] == "Legacy"
+
+def test_change_feed_pages_with_cursor(client: TestClient):
+    client.post("/services/bulk", json=[{"system_name": f"S{i}"} for i in range(3)], headers={"X-User": "import"})
+    first = client.post("/services/", json={"system_name": "Single"}).json()
+    client.post("/services/bulk", json=[{"id": first["id"], "system_name": "Renamed"}])
+
+    page = client.get("/history", params={"limit": 3})
+    assert [c["action"] for c in page.json()] == ["create"] * 3
+    assert {c["changed_by"] for c in page.json()} == {"import"}
+    rest = client.get("/history", params={"after": page.headers["X-Next-Cursor"]}).json()
+    assert [c["action"] for c in rest] == ["create", "update"]
+    assert rest[1]["changes"]["system_name"] == ["Single", "Renamed"]
+    assert client.get("/history", params={"after": rest[-1]["id"]}).json() == []
+
+def test_changes_feed_returns_upserts_and_tombstones(client: TestClient):
+    kept = client.post("/services/", json={"system_name": "Kept"}).json()
+    removed = client.post("/services/", json={"system_name": "Removed"}).json()
+    initial = client.get("/services/changes").json()
+    assert [s["system_name"] for s in initial["upserts"]] == ["Kept", "Removed"]
+    assert initial["deleted"] == [] and not initial["has_more"]
+
+    client.patch(f"/services/{kept['id']}", json={"status": "Approved"})
+    client.delete(f"/services/{removed['id']}")
+    client.post("/services/bulk", json=[{"system_name": "New"}])
+
+    delta = client.get("/services/changes", params={"since": initial["token"]}).json()
+    assert [s["system_name"] for s in delta["upserts"]] == ["Kept", "New"]
+    assert delta["upserts"][0]["status"] == "Approved"
+    assert delta["deleted"] == [removed["id"]]
+    assert client.get("/services/changes", params={"since": delta["token"]}).json()["upserts"] == []
+
+    # A first sync skips tombstones; small pages chain through has_more
+    first_page = client.get("/services/changes", params={"limit": 1}).json()
+    assert first_page["has_more"]
+    second_page = client.get("/services/changes", params={"since": first_page["token"], "limit": 5}).json()
+    assert [s["system_name"] for s in first_page["upserts"] + second_page["upserts"]] == ["Kept", "New"]
+    assert client.get("/services/changes", params={"since": "abc"}).status_code == 400
+
+def test_deleted_services_are_hidden(client: TestClient):
+    service = client.post("/services/", json={"system_name": "Ghost Service", "score_data_leakage": 10}).json()
+    client.delete(f"/services/{service['id']}")
+
+    assert client.get("/services/").json() == []
+    assert client.get("/services/", params={"search": "Ghost"}).json() == []
+    assert client.get("/services/search", params={"q": "Ghost"}).json() == []
+    assert client.get("/stats").json()["count"] == 0
+    assert client.patch(f"/services/{service['id']}", json={"status": "x"}).status_code == 404
+    assert client.delete(f"/services/{service['id']}").status_code == 404
+    assert client.get("/services/export", params={"format": "ndjson"}).text == ""
+
+    # Upserting the id again brings the service back
+    result = client.post("/services/bulk", json=[{"id": service["id"], "system_name": "Ghost Service"}]).json()
+    assert result["created"] == 1
+    assert client.get(f"/services/{service['id']}").status_code == 200
+    assert client.get("/stats").json()["count"] == 1
+
+def test_create_with_a_deleted_id_revives_the_service(client: TestClient):
+    service = client.post("/services/", json={"system_name": "Ghost Service", "status": "Old"}).json()
+    client.delete(f"/services/{service['id']}")
+
+    response = client.post("/services/", json={"id": service["id"], "system_name": "Revived Service"})
+    assert response.status_code == 200
+    assert response.json()["system_name"] == "Revived Service"
+    assert response.json()["status"] is None
+    assert client.get(f"/services/{service['id']}").status_code == 200
+    assert client.get("/stats").json()["count"] == 1
+    assert [c["action"] for c in client.get(f"/services/{service['id']}/history").json()][-1] == "create"
+
+    # A live id is a conflict, not a server error
+    assert client.post("/services/", json={"id": service["id"]}).status_code == 409
+
+def test_existing_rows_are_numbered_for_sync(tmp_path):
+    from sqlalchemy import create_engine as sa_create_engine
+
+    engine = sa_create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE cloudservice (id INTEGER PRIMARY KEY, system_name VARCHAR)")
+        connection.exec_driver_sql("INSERT INTO cloudservice (id, system_name) VALUES (3, 'a'), (7, 'b')")
+        migrate(connection)
+    with Session(engine) as session:
+        assert session.exec(select(CloudService.id, CloudService.updated_seq).order_by(CloudService.id)).all() == [
+            (3, 3), (7, 7),
+        ]
+    engine.dispose()
+
+def test_dates_and_flags_are_typed(client: TestClient):
+    service = client.post("/services/", json={
+        "system_name": "Typed", "committee_date": "2025-07-15", "approval_date": "",
+        "is_significant_cyber": "כן", "is_bia_relevant": "לא", "is_significant_outsourcing": "",
+    }).json()
+    assert service["committee_date"] == "2025-07-15"
+    assert service["approval_date"] is None
+    assert service["is_significant_cyber"] is True
+    assert service["is_bia_relevant"] is False
+    assert service["is_significant_outsourcing"] is None
+
+    assert client.post("/services/", json={"system_name": "x", "is_significant_cyber": "maybe"}).status_code == 422
+    assert client.post("/services/", json={"system_name": "x", "committee_date": "soon"}).status_code == 422
+
+def test_date_range_and_flag_filters(client: TestClient):
+    client.post("/services/bulk", json=[
+        {"system_name": "Q2", "committee_date": "2025-06-30", "is_significant_cyber": True},
+        {"system_name": "Q3a", "committee_date": "2025-07-01", "is_significant_cyber": True, "approval_date": "2025-08-01"},
+        {"system_name": "Q3b", "committee_date": "2025-09-30", "is_significant_cyber": False},
+        {"system_name": "None", "is_significant_cyber": None},
+    ])
+
+    def names(**params):
+        return [s["system_name"] for s in client.get("/services/", params=params).json()]
+
+    assert names(committee_from="2025-07-01", committee_to="2025-09-30") == ["Q3a", "Q3b"]
+    assert names(is_significant_cyber="true") == ["Q2", "Q3a"]
+    assert names(is_significant_cyber="false", committee_from="2025-07-01") == ["Q3b"]
+    assert names(approved_to="2025-12-31") == ["Q3a"]
+    page = client.get("/services/", params={"sort": "-committee_date", "limit": 2})
+    rest = client.get("/services/", params={"sort": "-committee_date", "cursor": page.headers["X-Next-Cursor"]})
+    assert [s["system_name"] for s in page.json() + rest.json()] == ["Q3b", "Q3a", "Q2", "None"]
+
+def test_date_and_flag_filters_use_indexes(session: Session):
+    from listing import ServiceFilters, apply_filters
+
+    for filters in (ServiceFilters(committee_from="2025-07-01"), ServiceFilters(is_significant_cyber=True)):
+        query = apply_filters(select(CloudService.id), filters)
+        sql = str(query.compile(session.get_bind(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in session.exec(text(f"EXPLAIN QUERY PLAN {sql}")).all())
+        assert "USING COVERING INDEX" in plan or "USING INDEX" in plan, plan
+
+def test_untyped_database_is_converted(tmp_path):
+    from sqlalchemy import create_engine as sa_create_engine
+    from models import ServiceChange
+    from search import apply_search
+
+    engine = sa_create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE cloudservice (id INTEGER PRIMARY KEY, system_name VARCHAR, committee_date VARCHAR, "
+            "approval_date VARCHAR, is_significant_cyber VARCHAR, is_bia_relevant VARCHAR)"
+        )
+        connection.exec_driver_sql("CREATE INDEX ix_cloudservice_system_name_id ON cloudservice (system_name, id)")
+        connection.exec_driver_sql(
+            "INSERT INTO cloudservice VALUES "
+            "(1, 'Dated', '05/06/2024', '2024-12-31', 'כן', 'לא'), "
+            "(2, 'Pending', 'בבדיקה', NULL, 'לא ידוע', ' ')"
+        )
+        migrate(connection)
+    with Session(engine) as session:
+        dated, pending = session.exec(select(CloudService).order_by(CloudService.id)).all()
+        assert (dated.committee_date, dated.approval_date) == (date(2024, 6, 5), date(2024, 12, 31))
+        assert (dated.is_significant_cyber, dated.is_bia_relevant) == (True, False)
+        assert (pending.committee_date, pending.is_significant_cyber, pending.is_bia_relevant) == (None, None, None)
+        # Text that was not a date or a yes/no answer is kept in the history,
+        # apart from the state
+        [change] = session.exec(select(ServiceChange)).all()
+        assert change.service_id == 2
+        assert change.changes == {}
+        assert change.legacy_values == {"committee_date": "בבדיקה", "is_significant_cyber": "לא ידוע"}
+        # Both rows read differently now, so replicas get them again
+        assert (dated.updated_seq, pending.updated_seq) == (1, 2)
+        assert check_rollups(session) == []
+        # The search index triggers were recreated with the table
+        session.add(CloudService(system_name="Searchable"))
+        session.commit()
+        found = session.exec(apply_search(select(CloudService), "Searchable", session)).all()
+        assert [s.system_name for s in found] == ["Searchable"]
+
+    # Before the migration the rows read as they do after it, minus the lost text
+    app = create_app()
+    app.dependency_overrides[get_read_session] = lambda: Session(engine)
+    client = TestClient(app)
+    for service_id in (1, 2):
+        response = client.get(f"/services/{service_id}/as-of", params={"at": "2020-01-01T00:00:00"})
+        assert response.status_code == 200
+        assert response.json() == client.get(f"/services/{service_id}").json() | {"updated_seq": None, "updated_at": None}
+    engine.dispose()
+
+def test_metrics_record_routes_and_queries(client: TestClient):
+    import metrics
+
+    labels = {"method": "GET", "route": "/services/{service_id}"}
+    before = metrics.REQUESTS.value(**labels, status="200")
+    queries_before = metrics.REQUEST_QUERIES.count(**labels)
+    service = client.post("/services/", json={"system_name": "Measured"}).json()
+    client.get(f"/services/{service['id']}")
+    client.get(f"/services/{service['id']}")  # served from the response cache
+    assert client.get("/services/999999").status_code == 404
+
+    assert metrics.REQUESTS.value(**labels, status="200") == before + 2
+    assert metrics.REQUESTS.value(**labels, status="404") >= 1
+    assert metrics.REQUEST_QUERIES.count(**labels) == queries_before + 3
+    assert metrics.IN_FLIGHT.value() == 0
+
+    body = client.get("/metrics").text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{method="GET",route="/services/{service_id}",status="200"}' in body
+    assert 'http_request_db_queries_bucket{method="POST",route="/services/",le="+Inf"}' in body
+    assert 'http_response_size_bytes_count{method="GET",route="/services/{service_id}"}' in body
+    # Both sync and async routes keep it out of the API schema
+    assert "/metrics" not in client.get("/openapi.json").json()["paths"]
+
+def test_failed_queries_do_not_leak_timings(session: Session):
+    from sqlalchemy.exc import OperationalError
+
+    connection = session.connection()
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("SELECT * FROM no_such_table")
+    assert connection.info["query_start"] == []
+
+def test_slow_queries_are_logged(client: TestClient, monkeypatch, caplog):
+    import metrics
+
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    slow_before = metrics.SLOW_QUERIES.value()
+    with caplog.at_level("WARNING", logger="metrics"):
+        client.get("/stats")
+    assert metrics.SLOW_QUERIES.value() > slow_before
+    assert any("Slow query" in record.message and "servicerollup" in record.message for record in caplog.records)
+
+def test_profiling_is_opt_in(client: TestClient, monkeypatch):
+    import metrics
+
+    assert client.get("/stats", headers={"X-Profile": "1"}).json()["count"] == 0
+    monkeypatch.setattr(metrics, "PROFILING_ENABLED", True)
+    response = client.get("/stats", headers={"X-Profile": "1"})
+    if importlib.util.find_spec("pyinstrument") is None:
+        assert response.status_code == 501
+    else:
+        assert response.headers["content-type"].startswith("text/html")
+
+def test_similar_services_and_duplicate_check(client: TestClient):
+    description = "פורטל ענן לניהול מסמכים וחתימה דיגיטלית עבור לקוחות הבנק, כולל אחסון מוצפן"
+    first = client.post("/services/", json={"system_name": "DocuSign", "requesting_unit": "חטיבה עסקית",
+                                            "solution_description": description})
+    assert "X-Possible-Duplicates" not in first.headers
+    second = client.post("/services/", json={"system_name": "Docusign", "requesting_unit": "חטיבת טכנולוגיות",
+                                             "solution_description": description + "."})
+    assert second.headers["X-Possible-Duplicates"] == str(first.json()["id"])
+    other = client.post("/services/", json={"system_name": "Salesforce",
+                                            "solution_description": "מערכת CRM לניהול קשרי לקוחות ומכירות"}).json()
+    client.post("/services/", json={"status": "no text"})
+
+    similar = client.get(f"/services/{first.json()['id']}/similar").json()
+    assert [s["id"] for s in similar] == [second.json()["id"]]
+    assert similar[0]["requesting_unit"] == "חטיבת טכנולוגיות"
+    assert similar[0]["similarity"] > 0.9
+    assert client.get(f"/services/{other['id']}/similar").json() == []
+
+    # Signatures follow edits and deletes
+    client.patch(f"/services/{other['id']}", json={"system_name": "DocuSign", "solution_description": description})
+    assert {s["id"] for s in client.get(f"/services/{first.json()['id']}/similar").json()} == {
+        second.json()["id"], other["id"],
+    }
+    client.delete(f"/services/{second.json()['id']}")
+    assert [s["id"] for s in client.get(f"/services/{first.json()['id']}/similar").json()] == [other["id"]]
+    assert client.get(f"/services/{second.json()['id']}/similar").status_code == 404
+
+def test_bulk_import_and_rebuild_index_signatures(client: TestClient, session: Session):
+    from models import ServiceSignature
+    from similarity import rebuild_signatures
+
+    rows = [{"system_name": f"Backup service {i}", "solution_description": "גיבוי שרתים לענן עם שחזור מהיר"}
+            for i in range(3)] + [{"system_name": "Monitoring", "solution_description": "ניטור ביצועים ותקלות"}]
+    ids = client.post("/services/bulk", json=rows).json()["ids"]
+    similar = client.get(f"/services/{ids[0]}/similar").json()
+    assert {s["id"] for s in similar} == set(ids[1:3])
+
+    # Signatures follow a re-import that changes the text
+    client.post("/services/bulk", json=[{"id": ids[2], **rows[3]}])
+    assert {s["id"] for s in client.get(f"/services/{ids[3]}/similar").json()} == {ids[2]}
+    client.post("/services/bulk", json=[{"id": ids[2], **rows[2]}])
+
+    session.execute(text("DELETE FROM servicesignature"))
+    session.execute(text("DELETE FROM servicesignaturebucket"))
+    rebuild_signatures(session)
+    session.commit()
+    assert len(session.exec(select(ServiceSignature)).all()) == 4
+    assert {s["id"] for s in client.get(f"/services/{ids[0]}/similar").json()} == set(ids[1:3])
+
+def test_bucket_keys_are_64_bit(session: Session):
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    import schema_v1
+    from models import ServiceSignatureBucket
+
+    # Step 1 creates the column wide, before step 5 fills it
+    for table in (ServiceSignatureBucket.__table__, schema_v1.metadata.tables["servicesignaturebucket"]):
+        assert "bucket BIGINT" in str(CreateTable(table).compile(dialect=postgresql.dialect()))
+    key = -(2 ** 63)
+    session.execute(ServiceSignatureBucket.__table__.insert(), [{"bucket": key, "service_id": 1}])
+    assert session.exec(select(ServiceSignatureBucket.bucket)).one() == key
+
+def test_existing_services_get_signatures(tmp_path):
+    from sqlalchemy import create_engine as sa_create_engine
+    from similarity import similar_services
+
+    engine = sa_create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE cloudservice (id INTEGER PRIMARY KEY, system_name VARCHAR)")
+        connection.exec_driver_sql(
+            "INSERT INTO cloudservice (id, system_name) VALUES (1, 'Zoom video meetings'), (2, 'Zoom video meeting')"
+        )
+        migrate(connection)
+    with Session(engine) as session:
+        assert [s["id"] for s in similar_services(session, 1)] == [2]
+    engine.dispose()
+
+def test_migrations_are_versioned(session: Session):
+    from migrations import LATEST_VERSION, schema_version
+
+    connection = session.connection()
+    assert schema_version(connection) == LATEST_VERSION
+    assert migrate(connection) == []
+    versions = session.execute(text("SELECT version FROM schemamigration ORDER BY version")).scalars().all()
+    assert versions == list(range(1, LATEST_VERSION + 1))
+
+def test_lifespan_migrates_prewarms_and_reports(tmp_path, monkeypatch):
+    import main
+    import migrations
+    import startup
+    from database import READ_POOL_SIZE, create_engines
+    from migrations import LATEST_VERSION, schema_version
+
+    writer, reader = create_engines(str(tmp_path / "app.db"))
+    monkeypatch.setattr(migrations, "engine", writer)
+    monkeypatch.setattr(main, "engine", writer)
+    monkeypatch.setattr(main, "read_engine", reader)
+    monkeypatch.setattr(main, "check_database_settings", lambda: {})
+    monkeypatch.setattr(startup, "REPORT", startup.StartupReport())
+    with TestClient(create_app(async_mode=False)) as client:
+        assert reader.pool.checkedin() == READ_POOL_SIZE
+        client.get("/")
+        metrics = client.get("/metrics").text
+    with writer.connect() as connection:
+        assert schema_version(connection) == LATEST_VERSION
+    assert list(startup.REPORT.phases) == ["migrations", "database settings", "prewarm"]
+    assert startup.REPORT.ready <= startup.REPORT.first_request
+    assert 'app_startup_milestone_seconds{milestone="first_request"}' in metrics
+    writer.dispose()
+    reader.dispose()
+
+def test_api_imports_are_timed_and_exclude_importer_dependencies():
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    code = (
+        "import json, sys, main, startup; print(json.dumps({'timed': [n for n, _ in startup.REPORT.imports],"
+        " 'heavy': [m for m in ('pandas', 'openpyxl', 'requests') if m in sys.modules]}))"
+    )
+    backend = Path(__file__).resolve().parent.parent
+    output = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    result = json.loads(output.stdout)
+    assert {"fastapi", "sqlmodel", "database", "migrations"} <= set(result["timed"])
+    assert result["heavy"] == []
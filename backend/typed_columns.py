@@ -0,0 +1,162 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+from sqlalchemy import Connection, bindparam, func, select, update
+from columns import DATE_COLUMNS, FLAG_COLUMNS, parse_flag
+from history import TRACKED_FIELDS, ChangeLog, add_legacy_values_column
+from models import CloudService
+from schema_v1 import cloudservice
+from stats import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Databases created before dates and yes/no flags were typed declare those
+# columns VARCHAR and hold free text ("01/02/2025", "כן"). SQLite keeps a
+# column's declared type, so the table is rebuilt with DATE/BOOLEAN columns
+# and every value is normalized: dates as import_excel.parse_date reads them,
+# flags with columns.parse_flag. Text that is neither becomes NULL, and the
+# original is kept in the legacy_values of a change history entry. Live rows
+# that now read differently get a new updated_seq, so /services/changes
+# sends them to replicas again.
+DATE_FIELDS = list(DATE_COLUMNS.values())
+FLAG_FIELDS = list(FLAG_COLUMNS.values())
+# What import_excel.parse_date reads as a date, parsed here without pandas so
+# the conversion gives the same result in every image: day-first numbers
+# (05/06/2024, 5.6.24 as 2024; month first when the month would be over 12),
+# year-first ones (2024-06-05, 2024/6/5), either with a time after it,
+# 20240605 and English month names.
+DAY_FIRST = re.compile(r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})")
+YEAR_FIRST = re.compile(r"(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})")
+TIME_OF_DAY = re.compile(r"(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?: ?(?:Z|[+-]\d{2}:?\d{2}))?)?")
+MONTH_NAME_FORMATS = ["%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y", "%B %d, %Y", "%b %d, %Y", "%Y%m%d"]
+MIGRATION_USER = "migration: typed columns"
+
+def _declared_types(connection: Connection) -> dict:
+    rows = connection.exec_driver_sql(f"PRAGMA table_info({CloudService.__tablename__})").all()
+    return {row[1]: row[2].upper() for row in rows}
+
+def needs_upgrade(connection: Connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    declared = _declared_types(connection)
+    expected = {name: "DATE" for name in DATE_FIELDS} | {name: "BOOLEAN" for name in FLAG_FIELDS}
+    return any(name in declared and declared[name] != kind for name, kind in expected.items())
+
+def _numeric_date(text: str) -> Optional[date]:
+    for pattern, day_first in ((YEAR_FIRST, False), (DAY_FIRST, True)):
+        match = pattern.match(text)
+        if match is None or not TIME_OF_DAY.fullmatch(text[match.end():]):
+            continue
+        if day_first:
+            day, month, year = (int(part) for part in match.groups())
+            if len(match.group(3)) == 2:
+                year += 2000
+            if month > 12 >= day:
+                day, month = month, day
+        else:
+            year, month, day = (int(part) for part in match.groups())
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+    return None
+
+def normalize_date(value) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    text = str(value).strip()
+    parsed = _numeric_date(text)
+    if parsed is not None:
+        return parsed
+    for pattern in MONTH_NAME_FORMATS:
+        try:
+            return datetime.strptime(text, pattern).date()
+        except ValueError:
+            pass
+    return None
+
+def _normalize_flag(value):
+    try:
+        return parse_flag(value)
+    except ValueError:
+        return None
+
+def _rebuild_table(connection: Connection) -> None:
+    # SQLite cannot change a column type in place: move the old table aside,
+    # create the current one (with its indexes) and copy the rows over.
+    # Triggers go with the old table; the search index recreates its own.
+    name = CloudService.__tablename__
+    old_columns = _declared_types(connection)
+    for kind, item in connection.exec_driver_sql(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL",
+        (name,),
+    ).all():
+        connection.exec_driver_sql(f'DROP {kind.upper()} "{item}"')
+    connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_untyped")
+    # As step 1 created it; columns added to the model since come in later steps
+    cloudservice.create(connection)
+    columns = ", ".join(c.name for c in cloudservice.columns if c.name in old_columns)
+    connection.exec_driver_sql(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {name}_untyped")
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _reads_differently(raw, value) -> bool:
+    # Whether the API returns something other than the stored text now
+    if _blank(raw):
+        return False
+    return raw != (value.isoformat() if isinstance(value, date) else value)
+
+def upgrade_typed_columns(connection: Connection) -> Optional[ChangeLog]:
+    # Returns None if there was nothing to convert, else the history entries
+    # for values that could not be converted, for the caller to write.
+    if not needs_upgrade(connection):
+        return None
+    log = ChangeLog(MIGRATION_USER)
+    name = CloudService.__tablename__
+    declared = _declared_types(connection)
+    fields = [f for f in TRACKED_FIELDS if f in declared]
+    typed = [f for f in DATE_FIELDS + FLAG_FIELDS if f in declared]
+    deleted_at = "deleted_at" if "deleted_at" in declared else "NULL AS deleted_at"
+    # Raw values, read before the typed columns would try to parse them
+    rows = connection.exec_driver_sql(
+        f"SELECT id, {deleted_at}, {', '.join(fields)} FROM {name} ORDER BY id"
+    ).mappings().all()
+    _rebuild_table(connection)
+
+    normalized = []
+    stamped = []
+    seq = connection.execute(select(func.max(CloudService.updated_seq))).scalar() or 0
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        values = {f: normalize_date(row[f]) if f in DATE_FIELDS else _normalize_flag(row[f]) for f in typed}
+        normalized.append({"row_id": row["id"], **values})
+        if row["deleted_at"] is not None:
+            continue
+        if any(_reads_differently(row[f], values[f]) for f in typed):
+            seq += 1
+            stamped.append({"row_id": row["id"], "updated_seq": seq, "updated_at": now})
+        lost = {f: row[f] for f in typed if not _blank(row[f]) and values[f] is None}
+        if lost:
+            # The typed values are the same before and after; only the text
+            # that could not be converted is gone, and it is not state
+            state = {**{f: row[f] for f in fields}, **values}
+            log.add(row["id"], state, state, legacy_values=lost)
+    for batch in (normalized, stamped):
+        if batch:
+            params = {f: bindparam(f) for f in batch[0] if f != "row_id"}
+            stmt = update(CloudService).where(CloudService.id == bindparam("row_id")).values(**params)
+            connection.execute(stmt, batch)
+    connection.exec_driver_sql(f"DROP TABLE {name}_untyped")
+    logger.info("Converted %d services to typed date and flag columns", len(rows))
+    return log
+
+def convert_typed_columns(connection: Connection) -> None:
+    log = upgrade_typed_columns(connection)
+    if log is not None:
+        # Step 6 adds the column too, but this step comes first on old databases
+        add_legacy_values_column(connection)
+        log.write(connection)
+        # Committee months were cut from the old text dates
+        rebuild_rollups(connection)
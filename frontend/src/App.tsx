@@ -45,9 +45,9 @@ interface CloudService {
   additional_factors: string
   other_factors: string
   provider_description: string
-  is_significant_outsourcing: string
-  is_significant_cyber: string
-  is_bia_relevant: string
+  is_significant_outsourcing: boolean | null
+  is_significant_cyber: boolean | null
+  is_bia_relevant: boolean | null
 }
 
 const DEFAULT_SERVICE: CloudService = {
@@ -91,9 +91,9 @@ const DEFAULT_SERVICE: CloudService = {
   additional_factors: '',
   other_factors: '',
   provider_description: '',
-  is_significant_outsourcing: '',
-  is_significant_cyber: '',
-  is_bia_relevant: ''
+  is_significant_outsourcing: null,
+  is_significant_cyber: null,
+  is_bia_relevant: null
 }
 
 function App() {
@@ -279,7 +279,7 @@ function App() {
         readOnly={readOnly}
         min={min}
         max={max}
-        value={currentService[field] || ''} 
+        value={(currentService[field] as string | number | null) || ''} 
         onChange={(e) => {
             if (field.startsWith('score_')) {
                 handleScoreChange(field, parseInt(e.target.value) || 0)
@@ -291,6 +291,26 @@ function App() {
     </Form.Group>
   )}
 
+  // Yes/no flags are booleans in the API; empty means not answered
+  const renderFlag = (label: string, field: 'is_significant_outsourcing' | 'is_significant_cyber' | 'is_bia_relevant') => {
+    const value = currentService[field]
+    return (
+    <Form.Group className="mb-3" controlId={`form-${field}`}>
+      <Form.Label>{label}</Form.Label>
+      <Form.Select
+        value={value === null || value === undefined ? '' : String(value)}
+        onChange={(e) => {
+            const selected = e.target.value
+            setCurrentService({...currentService, [field]: selected === '' ? null : selected === 'true'})
+        }}
+      >
+        <option value="">לא ידוע</option>
+        <option value="true">כן</option>
+        <option value="false">לא</option>
+      </Form.Select>
+    </Form.Group>
+  )}
+
   return (
     <Container fluid className="mt-4">
       <h1 className="mb-4">ועדת ממשל ענן - דוח מרוכז</h1>
@@ -449,9 +469,9 @@ function App() {
 
             <Tab eventKey="classification" title="סיווגים">
                <Row>
-                 <Col md={4}>{renderInput('ספק מיקור חוץ מהותי?', 'is_significant_outsourcing')}</Col>
-                 <Col md={4}>{renderInput('ספק סייבר מהותי?', 'is_significant_cyber')}</Col>
-                 <Col md={4}>{renderInput('רלוונטי ל-BIA?', 'is_bia_relevant')}</Col>
+                 <Col md={4}>{renderFlag('ספק מיקור חוץ מהותי?', 'is_significant_outsourcing')}</Col>
+                 <Col md={4}>{renderFlag('ספק סייבר מהותי?', 'is_significant_cyber')}</Col>
+                 <Col md={4}>{renderFlag('רלוונטי ל-BIA?', 'is_bia_relevant')}</Col>
                </Row>
                {renderInput('סיכום ועדה', 'committee_summary', 'text', 'textarea', 3)}
                {renderInput('הערות ועדה', 'committee_notes', 'text', 'textarea', 3)}
@@ -56,9 +56,9 @@ describe('App Component', () => {
       additional_factors: '',
       other_factors: '',
       provider_description: '',
-      is_significant_outsourcing: '',
-      is_significant_cyber: '',
-      is_bia_relevant: ''
+      is_significant_outsourcing: null,
+      is_significant_cyber: true,
+      is_bia_relevant: false
     }];
     
     (axios.get as any).mockResolvedValue({ data: mockServices })
@@ -87,4 +87,24 @@ describe('App Component', () => {
       expect(screen.getByLabelText('מגיש הבקשה')).toBeInTheDocument()
     })
   })
-})
\ No newline at end of file
+
+  it('sends yes/no flags as booleans', async () => {
+    (axios.get as any).mockResolvedValue({ data: [] });
+    (axios.post as any).mockResolvedValue({ data: {} })
+    render(<App />)
+
+    fireEvent.click(screen.getByText('הוסף שירות חדש'))
+    fireEvent.change(screen.getByLabelText('שם מערכת / פרויקט'), { target: { value: 'Flagged' } })
+    fireEvent.change(screen.getByLabelText('ספק סייבר מהותי?'), { target: { value: 'true' } })
+    fireEvent.change(screen.getByLabelText('רלוונטי ל-BIA?'), { target: { value: 'false' } })
+    fireEvent.click(screen.getByText('שמור'))
+
+    await waitFor(() => {
+      expect(axios.post).toHaveBeenCalledWith('http://localhost:8000/services/', expect.objectContaining({
+        is_significant_outsourcing: null,
+        is_significant_cyber: true,
+        is_bia_relevant: false
+      }))
+    })
+  })
+})